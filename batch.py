@@ -0,0 +1,366 @@
+"""Runs a plan of Docker and Kubernetes operations without any prompts.
+
+A plan is a YAML or JSON file:
+
+    workers: 8
+    steps:
+      - id: redis
+        op: docker.run
+        args: {image: redis:5.0.9-alpine, name: cache}
+      - id: scale-web
+        op: k8s.scale_deployment
+        args: {name: web, namespace: default, replicas: 4}
+        needs: [redis]
+
+Steps whose dependencies have all succeeded run concurrently, up to the
+worker limit; dependents of a failed step are skipped. The result is
+printed (or written with --output) as JSON with per-step latency.
+
+    python batch.py plan.yaml --workers 16 --output result.json
+"""
+import argparse
+import contextlib
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import metrics
+from taskgraph import check_graph, run_graph
+
+try:
+    import yaml
+except ImportError:  # YAML plans are optional; JSON always works
+    yaml = None
+
+DEFAULT_WORKERS = 4
+
+
+class PlanError(Exception):
+    """Raised when a plan is malformed"""
+
+
+class ActionSet:
+    """Creates each action class once, on first use, and shares it between steps"""
+
+    def __init__(self):
+        self._actions = {}
+        self._lock = threading.Lock()
+
+    def get(self, name):
+        with self._lock:
+            if name not in self._actions:
+                self._actions[name] = self._create(name)
+            return self._actions[name]
+
+    def _create(self, name):
+        # Imported lazily so a Docker-only plan never loads the kubernetes SDK
+        # and vice versa.
+        if name == "interact":
+            from docker_controllers.interact import InteractWithDockerActions
+            return InteractWithDockerActions()
+        if name == "orchestrate":
+            from docker_controllers.orchestrate import OrchestrateDockerActions
+            return OrchestrateDockerActions()
+        if name == "pods":
+            from k8s_controllers.pods import PodsActions
+            return PodsActions()
+        if name == "deployments":
+            from k8s_controllers.deployments import DeploymentActions
+            return DeploymentActions()
+        if name == "services":
+            from k8s_controllers.services import ServicesActions
+            return ServicesActions()
+        raise KeyError(name)
+
+
+def docker_run(actions, args):
+    container = actions.get("interact").start_container(args["image"], args.get("name"))
+    return {"id": container.id, "name": container.name}
+
+
+def docker_remove_all(actions, args):
+    summary = actions.get("interact").remove_all_containers(timeout=args.get("timeout", 10),
+                                                            force=args.get("force", False))
+    failed = [result for result in summary["results"] if not result["Success"]]
+    if failed:
+        raise RuntimeError(f"{len(failed)} container(s) could not be removed")
+    return summary
+
+
+def docker_save_image(actions, args):
+    from docker_controllers.image_io import ImageArchiver
+    return ImageArchiver(actions.get("interact").client).export(args["image"], args["output"],
+                                                                args.get("compression", "none"))
+
+
+def docker_load_image(actions, args):
+    from docker_controllers.image_io import ImageArchiver
+    stats = ImageArchiver(actions.get("interact").client).load(args["archive"])
+    stats["images"] = [image.tags or [image.short_id] for image in stats["images"]]
+    return stats
+
+
+def docker_build_and_run(actions, args):
+    orchestrate = actions.get("orchestrate")
+    # A Dockerfile per step, so that steps running side by side do not
+    # overwrite each other's ./Dockerfile.
+    with tempfile.TemporaryDirectory(prefix="batch-build-") as directory:
+        dockerfile = os.path.join(directory, "Dockerfile")
+        orchestrate.create_dockerfile(args["program"], args.get("python_version", "3.11"), dockerfile)
+        image = orchestrate.build_image(args["image"], dockerfile=dockerfile)
+    if image is None:
+        raise RuntimeError(f"building image {args['image']} failed")
+    orchestrate.run_and_manage_container(image)
+    return {"image": image.id}
+
+
+def docker_run_replicas(actions, args):
+    from docker_controllers.replicas import PortAllocator, ReplicaFanout, parse_port_range
+    first, last = parse_port_range(args.get("ports"))
+    fanout = ReplicaFanout(actions.get("orchestrate").client, PortAllocator(first, last))
+    results = fanout.run(args["image"], args.get("replicas"))
+    failed = [result for result in results if not result["Ready"]]
+    if failed:
+        raise RuntimeError(f"{len(failed)} replica(s) did not become ready")
+    return results
+
+
+def compose_up(actions, args):
+    from docker_controllers.compose import compose_up
+    report = compose_up(args["file"])
+    failed = [name for name, result in report["services"].items() if not result["Ready"]]
+    if failed:
+        raise RuntimeError(f"service(s) not ready: {', '.join(sorted(failed))}")
+    return report
+
+
+def compose_reconcile(actions, args):
+    from docker_controllers.compose import compose_reconcile
+    report = compose_reconcile(args["file"])
+    failed = [name for name, result in report["services"].items() if not result["Ready"]]
+    if failed:
+        raise RuntimeError(f"service(s) not ready: {', '.join(sorted(failed))}")
+    return report
+
+
+def compose_down(actions, args):
+    from docker_controllers.compose import compose_down
+    compose_down(args["file"])
+
+
+def k8s_create_pods(actions, args):
+    results = actions.get("pods").place_pods(args["image"], args.get("name", f"{args['image'].split(':')[0]}-pod"),
+                                             args.get("namespace", "default"))
+    failed = [result for result in results if not result["Success"]]
+    if failed:
+        raise RuntimeError(f"{len(failed)} pod(s) could not be created")
+    return results
+
+
+def k8s_scale_deployment(actions, args):
+    resp = actions.get("deployments").scale(args["name"], args.get("namespace", "default"), int(args["replicas"]))
+    return {"replicas": resp.spec.replicas}
+
+
+def k8s_set_image(actions, args):
+    deployments = actions.get("deployments")
+    namespace = args.get("namespace", "default")
+    deployments.set_image(args["name"], namespace, args["image"])
+    if not args.get("wait", False):
+        return None
+    from k8s_controllers.rollout import RolloutMonitor
+    outcome = RolloutMonitor(deployments.app_api).follow(args["name"], namespace,
+                                                         rollback=args.get("rollback", False))
+    if outcome["Status"] != "complete":
+        raise RuntimeError(f"rollout {outcome['Status']}: {outcome['Error']}")
+    return outcome
+
+
+def k8s_bulk_set_image(actions, args):
+    bulk = actions.get("deployments").bulk
+    deployments = bulk.select(args.get("namespace"), args.get("selector"))
+    return _bulk_results(bulk.set_image(deployments, args["image"], args.get("container"),
+                                        server_side=args.get("server_side", False)))
+
+
+def k8s_bulk_scale(actions, args):
+    bulk = actions.get("deployments").bulk
+    deployments = bulk.select(args.get("namespace"), args.get("selector"))
+    return _bulk_results(bulk.scale(deployments, int(args["replicas"])))
+
+
+def _bulk_results(results):
+    failed = [result for result in results if not result["Success"]]
+    if failed:
+        raise RuntimeError(f"{len(failed)} of {len(results)} deployment(s) could not be updated")
+    return results
+
+
+def k8s_apply_manifests(actions, args):
+    from k8s_controllers.manifests import ManifestApplier, load_manifests
+    manifests = load_manifests(args["directory"])
+    results = ManifestApplier(actions.get("services").api_client, int(args.get("workers", 16))).apply(
+        manifests, dry_run=args.get("dry_run", False))
+    failed = [result for result in results if not result["Success"]]
+    if failed:
+        raise RuntimeError(f"{len(failed)} of {len(results)} manifest(s) could not be applied")
+    return [result for result in results if result["Action"] != "unchanged"]
+
+
+def k8s_delete_deployment(actions, args):
+    actions.get("deployments").delete(args["name"], args.get("namespace", "default"))
+
+
+def k8s_create_deployment(actions, args):
+    actions.get("services").create_deployment(args["name"], args["image"], int(args.get("replicas", 1)),
+                                              args.get("env", {}))
+
+
+def k8s_create_service(actions, args):
+    actions.get("services").create_service(args["name"], args.get("selector", {"app": args["name"]}),
+                                           args.get("type", "ClusterIP"), args["ports"])
+
+
+OPERATIONS = {
+    "docker.run": docker_run,
+    "docker.remove_all": docker_remove_all,
+    "docker.save_image": docker_save_image,
+    "docker.load_image": docker_load_image,
+    "docker.build_and_run": docker_build_and_run,
+    "docker.run_replicas": docker_run_replicas,
+    "compose.up": compose_up,
+    "compose.reconcile": compose_reconcile,
+    "compose.down": compose_down,
+    "k8s.create_pods": k8s_create_pods,
+    "k8s.scale_deployment": k8s_scale_deployment,
+    "k8s.set_image": k8s_set_image,
+    "k8s.bulk_set_image": k8s_bulk_set_image,
+    "k8s.bulk_scale": k8s_bulk_scale,
+    "k8s.delete_deployment": k8s_delete_deployment,
+    "k8s.create_deployment": k8s_create_deployment,
+    "k8s.create_service": k8s_create_service,
+    "k8s.apply_manifests": k8s_apply_manifests,
+}
+
+
+def load_plan(path):
+    """Read a YAML or JSON plan file"""
+    with open(path) as plan_file:
+        if path.endswith((".yaml", ".yml")):
+            if yaml is None:
+                raise PlanError("YAML plans require the 'pyyaml' package")
+            return yaml.safe_load(plan_file)
+        return json.load(plan_file)
+
+
+def normalise_needs(step_id, needs):
+    """Return a step's needs as a list of step ids; a single id may be given as a string"""
+    if needs is None:
+        return []
+    if isinstance(needs, (str, int)):
+        return [str(needs)]
+    if isinstance(needs, list):
+        return [str(need) for need in needs]
+    raise PlanError(f"step '{step_id}' needs must be a step id or a list of step ids")
+
+
+def validate_plan(plan):
+    """Check the steps of a plan and return them keyed by id in file order"""
+    if not isinstance(plan, dict):
+        raise PlanError("a plan must be a mapping with a 'steps' list")
+    if not isinstance(plan.get("steps") or [], list):
+        raise PlanError("'steps' must be a list")
+    steps = {}
+    for index, step in enumerate(plan.get("steps") or []):
+        if not isinstance(step, dict):
+            raise PlanError(f"step {index} must be a mapping, not {type(step).__name__}")
+        step_id = str(step.get("id", index))
+        if step_id in steps:
+            raise PlanError(f"duplicate step id '{step_id}'")
+        if step.get("op") not in OPERATIONS:
+            raise PlanError(f"step '{step_id}' has unknown op '{step.get('op')}'")
+        if not isinstance(step.get("args") or {}, dict):
+            raise PlanError(f"step '{step_id}' args must be a mapping")
+        steps[step_id] = dict(step, id=step_id, needs=normalise_needs(step_id, step.get("needs")))
+
+    try:
+        check_graph({step_id: step["needs"] for step_id, step in steps.items()}, "step")
+    except ValueError as ex:
+        raise PlanError(str(ex)) from ex
+    return steps
+
+
+class PlanExecutor:
+    """Runs the steps of a plan concurrently in dependency order"""
+
+    def __init__(self, plan, workers=None, actions=None):
+        self.steps = validate_plan(plan)
+        self.workers = workers or plan.get("workers") or DEFAULT_WORKERS
+        self.actions = actions or ActionSet()
+
+    def run(self):
+        """Execute the plan and return a machine-readable result"""
+        started = time.monotonic()
+        results = run_graph({step_id: step["needs"] for step_id, step in self.steps.items()},
+                            self._run_step, self.workers)
+        ordered = [results[step_id] for step_id in self.steps]
+        return {
+            "ok": all(result["status"] == "ok" for result in ordered),
+            "seconds": time.monotonic() - started,
+            "steps": ordered,
+        }
+
+    def _run_step(self, step_id, results):
+        step = self.steps[step_id]
+        started = time.monotonic()
+        failed = [need for need in step["needs"] if results[need]["status"] != "ok"]
+        if failed:
+            # Dependents of a skipped step are skipped in turn.
+            output, status, error = None, "skipped", f"dependency '{failed[0]}' did not succeed"
+        else:
+            try:
+                output = OPERATIONS[step["op"]](self.actions, step.get("args") or {})
+                status, error = "ok", None
+            except Exception as ex:
+                output, status, error = None, "failed", f"{type(ex).__name__}: {ex}"
+        return {
+            "id": step["id"],
+            "op": step["op"],
+            "status": status,
+            "seconds": 0.0 if failed else time.monotonic() - started,
+            "result": output,
+            "error": error,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a plan of Docker and Kubernetes operations")
+    parser.add_argument("plan", help="path to a YAML or JSON plan")
+    parser.add_argument("--workers", type=int, help=f"maximum concurrent steps (default: plan value or {DEFAULT_WORKERS})")
+    parser.add_argument("--output", help="write the JSON result to this file instead of stdout")
+    args = parser.parse_args()
+    metrics.start()
+
+    try:
+        # The action classes report progress with print(); keep that chatter
+        # on stderr so stdout carries only the JSON result.
+        with contextlib.redirect_stdout(sys.stderr):
+            result = PlanExecutor(load_plan(args.plan), workers=args.workers).run()
+    except (OSError, ValueError, PlanError) as ex:
+        print(f"Error: Unable to run the plan - {ex}", file=sys.stderr)
+        return 2
+
+    report = json.dumps(result, indent=2, default=str)
+    if args.output:
+        with open(args.output, "w") as output_file:
+            output_file.write(report)
+    else:
+        print(report)
+    return 0 if result["ok"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
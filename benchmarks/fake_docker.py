@@ -0,0 +1,223 @@
+"""A stand-in for the Docker Engine API on a unix socket, seeded with synthetic containers.
+
+Only the endpoints the controllers use are implemented, with just enough of
+each document for docker-py and the asyncio engine to accept it.
+"""
+import itertools
+import json
+import os
+import re
+import socketserver
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler
+from urllib.parse import parse_qs, urlparse
+
+API_VERSION = "1.43"
+VERSIONED_PATH = re.compile(r"^/v[0-9.]+(/.*)$")
+
+FIRST_HOST_PORT = 10000
+EXITED_EVERY = 10
+
+
+def container_summary(container_id, name, image, running=True, host_port=None):
+    """Return a /containers/json entry"""
+    ports = [{"PrivatePort": 80, "Type": "tcp"}]
+    if host_port is not None:
+        ports = [{"IP": "0.0.0.0", "PrivatePort": 80, "PublicPort": host_port, "Type": "tcp"},
+                 {"IP": "::", "PrivatePort": 80, "PublicPort": host_port, "Type": "tcp"}]
+    return {
+        "Id": container_id,
+        "Names": [f"/{name}"],
+        "Image": image,
+        "ImageID": "sha256:" + "0" * 64,
+        "Command": "nginx -g 'daemon off;'",
+        "Created": 1700000000,
+        "Ports": ports if running else [],
+        "Labels": {"benchmark": "scale"},
+        "State": "running" if running else "exited",
+        "Status": "Up 1 hour" if running else "Exited (0) 1 hour ago",
+    }
+
+
+def inspect_document(summary):
+    """Return the /containers/{id}/json document of a container summary"""
+    running = summary["State"] == "running"
+    ports = {}
+    for port in summary["Ports"]:
+        key = f"{port['PrivatePort']}/{port['Type']}"
+        ports.setdefault(key, None)
+        if port.get("PublicPort"):
+            ports[key] = (ports[key] or []) + [{"HostIp": port["IP"], "HostPort": str(port["PublicPort"])}]
+    return {
+        "Id": summary["Id"],
+        "Name": summary["Names"][0],
+        "Image": summary["ImageID"],
+        "Created": "2023-11-14T22:13:20Z",
+        "State": {"Status": summary["State"], "Running": running, "ExitCode": 0},
+        "Config": {"Image": summary["Image"], "Labels": summary["Labels"]},
+        "HostConfig": {"NetworkMode": "default"},
+        "NetworkSettings": {"Ports": ports},
+    }
+
+
+class FakeDockerEngine:
+    """Serves a synthetic container inventory and counts the requests it gets"""
+
+    def __init__(self):
+        self.requests = 0
+        self._containers = {}
+        self._ids = itertools.count()
+        self._listings = {}
+        self._lock = threading.Lock()
+        self._server = None
+        self.socket_path = None
+
+    def seed(self, count):
+        """Replace the inventory with count containers, every tenth of them exited"""
+        with self._lock:
+            self._containers = {}
+            self._listings = {}
+            for index in range(count):
+                running = index % EXITED_EVERY != EXITED_EVERY - 1
+                container_id = f"{next(self._ids):064x}"
+                self._containers[container_id] = container_summary(
+                    container_id, f"bench-{index}", "nginx:1.25", running,
+                    FIRST_HOST_PORT + index if running else None)
+            self.requests = 0
+
+    def start(self):
+        """Serve the API on a fresh unix socket, returning its DOCKER_HOST url"""
+        self.socket_path = os.path.join(tempfile.mkdtemp(prefix="fake-docker-"), "docker.sock")
+        self._server = _UnixHTTPServer(self.socket_path, _DockerHandler)
+        self._server.engine = self
+        threading.Thread(target=self._server.serve_forever, daemon=True, name="fake-docker").start()
+        return f"unix://{self.socket_path}"
+
+    def stop(self):
+        """Stop serving and remove the socket"""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            os.unlink(self.socket_path)
+            os.rmdir(os.path.dirname(self.socket_path))
+            self._server = None
+
+    def handle(self, method, path, query, body):
+        """Answer one request, returning (status, document)"""
+        with self._lock:
+            self.requests += 1
+            segments = path.strip("/").split("/")
+            if path in ("/_ping", "/version"):
+                return 200, {"ApiVersion": API_VERSION, "Version": "24.0.0", "MinAPIVersion": "1.12"}
+            if segments[0] != "containers":
+                return 404, {"message": f"page not found: {path}"}
+            if path == "/containers/json" and method == "GET":
+                return 200, self._listing(query)
+            if path == "/containers/create" and method == "POST":
+                return self._create(query.get("name", [None])[0], body)
+            if path == "/containers/prune" and method == "POST":
+                pruned = [container_id for container_id, summary in self._containers.items()
+                          if summary["State"] == "exited"]
+                self._forget(pruned)
+                return 200, {"ContainersDeleted": pruned, "SpaceReclaimed": 0}
+
+            summary = self._containers.get(segments[1] if len(segments) > 1 else "")
+            if summary is None:
+                return 404, {"message": f"No such container: {segments[1] if len(segments) > 1 else ''}"}
+            action = segments[2] if len(segments) > 2 else None
+            if method == "DELETE" and action is None:
+                if summary["State"] == "running" and query.get("force", ["false"])[0].lower() not in ("1", "true"):
+                    return 409, {"message": "cannot remove a running container"}
+                self._forget([summary["Id"]])
+                return 204, None
+            if method == "GET" and action == "json":
+                return 200, inspect_document(summary)
+            if method == "POST" and action in ("start", "stop", "kill"):
+                self._set_running(summary, action == "start")
+                return 204, None
+            return 404, {"message": f"page not found: {path}"}
+
+    def _listing(self, query):
+        # Serialised once per inventory change, as a large listing dominates
+        # the server's own time otherwise.
+        all_containers = query.get("all", ["0"])[0].lower() in ("1", "true")
+        filters = json.loads(query.get("filters", ["{}"])[0] or "{}")
+        statuses = filters.get("status")
+        if isinstance(statuses, dict):
+            statuses = [status for status, wanted in statuses.items() if wanted]
+        key = (all_containers, tuple(statuses or ()))
+        if key not in self._listings:
+            self._listings[key] = json.dumps([
+                summary for summary in self._containers.values()
+                if (all_containers or statuses or summary["State"] == "running")
+                and (not statuses or summary["State"] in statuses)
+            ]).encode()
+        return self._listings[key]
+
+    def _create(self, name, body):
+        container_id = f"{next(self._ids):064x}"
+        name = name or f"bench-created-{container_id[-8:]}"
+        if any(summary["Names"][0] == f"/{name}" for summary in self._containers.values()):
+            return 409, {"message": f'Conflict. The container name "/{name}" is already in use'}
+        self._containers[container_id] = container_summary(container_id, name, body.get("Image", ""), running=False)
+        self._listings = {}
+        return 201, {"Id": container_id, "Warnings": []}
+
+    def _set_running(self, summary, running):
+        summary["State"] = "running" if running else "exited"
+        if not running:
+            summary["Ports"] = []
+        self._listings = {}
+
+    def _forget(self, container_ids):
+        for container_id in container_ids:
+            del self._containers[container_id]
+        self._listings = {}
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+    # Bulk operations open a connection per worker at once.
+    request_queue_size = 128
+
+
+class _DockerHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self._answer()
+
+    def do_HEAD(self):
+        self._answer()
+
+    def do_POST(self):
+        self._answer()
+
+    def do_DELETE(self):
+        self._answer()
+
+    def _answer(self):
+        url = urlparse(self.path)
+        match = VERSIONED_PATH.match(url.path)
+        path = match.group(1) if match else url.path
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}") if length else {}
+        status, document = self.server.engine.handle(self.command, path, parse_qs(url.query), body)
+
+        self.send_response(status)
+        if status == 204:
+            self.end_headers()
+            return
+        data = document if isinstance(document, bytes) else json.dumps(document).encode()
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(data)
+
+    def address_string(self):
+        return "unix"
+
+    def log_message(self, *args):
+        pass
@@ -0,0 +1,211 @@
+"""A stand-in for the kube-apiserver over HTTP, seeded with synthetic namespaces, nodes, pods and deployments.
+
+Lists honour limit/continue, watches stay open without events until they
+time out, and pod creation is the only write.
+"""
+import itertools
+import json
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+OBJECTS_PER_NAMESPACE = 100
+MAX_NODES = 100
+MAX_WATCH_SECONDS = 60
+
+COLLECTIONS = {
+    "pods": ("/api/v1", "PodList"),
+    "deployments": ("/apis/apps/v1", "DeploymentList"),
+}
+COLLECTION_PATH = re.compile(r"^(/api/v1|/apis/apps/v1)(?:/namespaces/([^/]+))?/(pods|deployments)$")
+
+
+def namespace_name(index):
+    """Return the name of the index-th synthetic namespace"""
+    return f"bench-{index}"
+
+
+def metadata(name, namespace=None, uid=0, labels=None):
+    """Return object metadata"""
+    document = {"name": name, "uid": f"00000000-0000-0000-0000-{uid:012d}", "resourceVersion": "1",
+                "creationTimestamp": "2023-11-14T22:13:20Z", "labels": labels or {}}
+    if namespace is not None:
+        document["namespace"] = namespace
+    return document
+
+
+def pod_template(app, image):
+    """Return a single-container pod spec with its labels"""
+    return {"metadata": {"labels": {"app": app}}, "spec": {"containers": [{"name": "app", "image": image}]}}
+
+
+class FakeKubeApiServer:
+    """Serves a synthetic cluster inventory and counts the requests it gets"""
+
+    def __init__(self):
+        self.requests = 0
+        self.namespaces = []
+        self.nodes = []
+        self._objects = {name: {} for name in COLLECTIONS}
+        self._uids = itertools.count(1)
+        self._resource_version = 1
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._server = None
+
+    def seed(self, count):
+        """Replace the inventory with count pods and count deployments, a hundred per namespace"""
+        with self._lock:
+            namespaces = [namespace_name(index) for index in range(max(1, -(-count // OBJECTS_PER_NAMESPACE)))]
+            self.namespaces = [{"metadata": metadata(name, uid=next(self._uids))} for name in namespaces]
+            self.nodes = [{"metadata": metadata(f"node-{index}", uid=next(self._uids),
+                                                labels={"kubernetes.io/hostname": f"node-{index}"})}
+                          for index in range(max(1, min(count, MAX_NODES)))]
+            # The first node plays the control plane, which placement skips.
+            self.nodes[0]["metadata"]["labels"]["node-role.kubernetes.io/control-plane"] = ""
+
+            self._objects = {name: {namespace: [] for namespace in namespaces} for name in COLLECTIONS}
+            for index in range(count):
+                namespace = namespaces[index // OBJECTS_PER_NAMESPACE]
+                app = f"app-{index}"
+                template = pod_template(app, "nginx:1.25")
+                self._objects["pods"][namespace].append({
+                    "metadata": metadata(f"{app}-pod", namespace, next(self._uids), {"app": app}),
+                    "spec": dict(template["spec"], nodeName=self.nodes[index % len(self.nodes)]["metadata"]["name"]),
+                    "status": {"phase": "Running"},
+                })
+                self._objects["deployments"][namespace].append({
+                    "metadata": metadata(app, namespace, next(self._uids), {"app": app}),
+                    "spec": {"replicas": 1, "selector": {"matchLabels": {"app": app}}, "template": template},
+                    "status": {"replicas": 1, "readyReplicas": 1, "availableReplicas": 1, "updatedReplicas": 1},
+                })
+            self.requests = 0
+
+    def start(self):
+        """Serve the API on a free local port, returning its url"""
+        self._stopping.clear()
+        self._server = _KubeHTTPServer(("127.0.0.1", 0), _KubeHandler)
+        self._server.cluster = self
+        threading.Thread(target=self._server.serve_forever, daemon=True, name="fake-kube").start()
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def stop(self):
+        """End the open watches and stop serving"""
+        self._stopping.set()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def count_request(self):
+        """Count a request that handle() does not answer"""
+        with self._lock:
+            self.requests += 1
+
+    def wait_stopping(self, seconds):
+        """Block a watch for up to seconds, returning early when the server stops"""
+        self._stopping.wait(seconds)
+
+    def handle(self, method, path, query, body):
+        """Answer one request, returning (status, document)"""
+        with self._lock:
+            self.requests += 1
+            if method == "GET" and path == "/api/v1/namespaces":
+                return 200, self._list("NamespaceList", self.namespaces, query)
+            if method == "GET" and path == "/api/v1/nodes":
+                return 200, self._list("NodeList", self.nodes, query)
+
+            match = COLLECTION_PATH.match(path)
+            if match is None or COLLECTIONS[match.group(3)][0] != match.group(1):
+                return 404, status_document(404, "NotFound", f"the server could not find {path}")
+            _, namespace, collection = match.groups()
+            objects = self._objects[collection]
+            if method == "GET":
+                if namespace is None:
+                    items = [obj for namespace_objects in objects.values() for obj in namespace_objects]
+                else:
+                    items = objects.get(namespace, [])
+                return 200, self._list(COLLECTIONS[collection][1], items, query)
+            if method == "POST" and collection == "pods" and namespace is not None:
+                return self._create_pod(namespace, body)
+            return 405, status_document(405, "MethodNotAllowed", f"{method} is not supported on {path}")
+
+    def _list(self, kind, items, query):
+        offset = int(query.get("continue", ["0"])[0] or 0)
+        limit = int(query.get("limit", ["0"])[0] or 0)
+        end = offset + limit if limit else len(items)
+        list_metadata = {"resourceVersion": str(self._resource_version)}
+        if end < len(items):
+            list_metadata["continue"] = str(end)
+        return {"kind": kind, "apiVersion": "v1", "metadata": list_metadata, "items": items[offset:end]}
+
+    def _create_pod(self, namespace, pod):
+        if namespace not in self._objects["pods"]:
+            return 404, status_document(404, "NotFound", f'namespaces "{namespace}" not found')
+        name = pod["metadata"]["name"]
+        if any(existing["metadata"]["name"] == name for existing in self._objects["pods"][namespace]):
+            return 409, status_document(409, "AlreadyExists", f'pods "{name}" already exists')
+        self._resource_version += 1
+        pod["metadata"].update(metadata(name, namespace, next(self._uids), pod["metadata"].get("labels")),
+                               resourceVersion=str(self._resource_version))
+        pod["status"] = {"phase": "Pending"}
+        self._objects["pods"][namespace].append(pod)
+        return 201, pod
+
+
+def status_document(code, reason, message):
+    """Return a failure Status object"""
+    return {"kind": "Status", "apiVersion": "v1", "status": "Failure", "code": code, "reason": reason,
+            "message": message}
+
+
+class _KubeHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+
+class _KubeHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self._answer()
+
+    def do_POST(self):
+        self._answer()
+
+    def _answer(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        cluster = self.server.cluster
+        if query.get("watch", ["false"])[0].lower() in ("1", "true"):
+            self._watch(cluster, query)
+            return
+
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length)) if length else None
+        status, document = cluster.handle(self.command, url.path, query, body)
+        data = json.dumps(document).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _watch(self, cluster, query):
+        cluster.count_request()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        # Nothing changes behind the benchmark's back, so the stream only
+        # ends when its timeout runs out.
+        cluster.wait_stopping(min(int(query.get("timeoutSeconds", [MAX_WATCH_SECONDS])[0]), MAX_WATCH_SECONDS))
+        try:
+            self.wfile.write(b"0\r\n\r\n")
+        except OSError:
+            pass
+        self.close_connection = True
+
+    def log_message(self, *args):
+        pass
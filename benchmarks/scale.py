@@ -0,0 +1,217 @@
+"""Measures how the Docker and Kubernetes actions scale with the size of the inventory.
+
+Each case runs in a fresh interpreter against in-process stand-ins for the
+Docker Engine API (unix socket) and the kube-apiserver (HTTP), seeded with
+that many synthetic containers, pods and deployments. Run from the
+repository root:
+
+    python benchmarks/scale.py [--sizes 10,1000,50000] [--cases docker.list,k8s.pods] [--json results.json]
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.abspath(os.path.dirname(__file__)))
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+
+DEFAULT_SIZES = "10,1000,50000"
+CASE_TIMEOUT = 900
+# Creates are issued one by one as in the menus, so they are capped rather
+# than scaled with the inventory.
+MAX_CREATES = 100
+IMAGE = "nginx:1.25"
+
+
+def docker_list(size):
+    """List every container"""
+    from docker_controllers.interact import InteractWithDockerActions
+    InteractWithDockerActions().list_all_containers()
+
+
+def docker_port_lookup(size):
+    """Resolve published host ports back to their containers"""
+    from benchmarks.fake_docker import FIRST_HOST_PORT
+    from docker_controllers.interact import InteractWithDockerActions
+    actions = InteractWithDockerActions()
+    step = max(1, size // MAX_CREATES)
+    return sum(len(actions.ports.lookup(port)) for port in range(FIRST_HOST_PORT, FIRST_HOST_PORT + size, step))
+
+
+def docker_create(size):
+    """Run containers one after another"""
+    from docker_controllers.interact import InteractWithDockerActions
+    actions = InteractWithDockerActions()
+    count = min(size, MAX_CREATES)
+    for index in range(count):
+        actions.start_container(IMAGE, f"bench-new-{index}")
+    return count
+
+
+def docker_teardown(size):
+    """Stop and remove every running container, then prune"""
+    from docker_controllers.interact import InteractWithDockerActions
+    summary = InteractWithDockerActions().remove_all_containers(timeout=0)
+    return sum(result["Success"] for result in summary["results"]) + len(summary["pruned"])
+
+
+def k8s_namespaces(size):
+    """Discover the namespaces"""
+    from k8s_controllers.pods import PodsActions
+    return len(PodsActions().list_namespaces())
+
+
+def k8s_pods(size):
+    """List the pods of one namespace"""
+    from benchmarks.fake_kube import namespace_name
+    from k8s_controllers.pods import PodsActions
+    return len(PodsActions().get_pods_in_namespace(namespace_name(0)))
+
+
+def k8s_deployments(size):
+    """List the deployments of one namespace"""
+    from benchmarks.fake_kube import namespace_name
+    from k8s_controllers.deployments import DeploymentActions
+    return len(list(DeploymentActions().iter_deployments(namespace_name(0))))
+
+
+def k8s_create_pods(size):
+    """Place a pod on every worker node"""
+    from benchmarks.fake_kube import namespace_name
+    from k8s_controllers.pods import PodsActions
+    results = PodsActions().place_pods(IMAGE, "bench-new-", namespace_name(0))
+    return sum(result["Success"] for result in results)
+
+
+CASES = {
+    "docker.list": docker_list,
+    "docker.port_lookup": docker_port_lookup,
+    "docker.create": docker_create,
+    "docker.teardown": docker_teardown,
+    "k8s.namespaces": k8s_namespaces,
+    "k8s.pods": k8s_pods,
+    "k8s.deployments": k8s_deployments,
+    "k8s.create_pods": k8s_create_pods,
+}
+
+
+def run_child(case, size):
+    """Run one case in this interpreter and print its wall time and peak RSS as JSON"""
+    sys.path[:0] = [REPO_ROOT]
+    # The menus print a line per object; the terminal must not be what is measured.
+    stdout = sys.stdout
+    with open(os.devnull, "w") as devnull:
+        sys.stdout = devnull
+        started = time.perf_counter()
+        try:
+            items = CASES[case](size)
+        finally:
+            seconds = time.perf_counter() - started
+            sys.stdout = stdout
+    print(json.dumps({"seconds": seconds, "items": items, "max_rss_kb": peak_rss_kb()}))
+
+
+def peak_rss_kb():
+    """Return the peak resident set size of this process in kilobytes"""
+    # getrusage keeps the high-water mark of the forking parent across exec
+    # on Linux, which would report the fakes' inventory; VmHWM does not.
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    # Kilobytes on Linux, bytes on macOS.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // (1024 if sys.platform == "darwin" else 1)
+
+
+def write_kubeconfig(directory, server):
+    """Write a kubeconfig pointing at the fake api server, returning its path"""
+    path = os.path.join(directory, "kubeconfig")
+    with open(path, "w") as kubeconfig:
+        json.dump({
+            "apiVersion": "v1",
+            "kind": "Config",
+            "clusters": [{"name": "bench", "cluster": {"server": server}}],
+            "users": [{"name": "bench", "user": {"token": "bench"}}],
+            "contexts": [{"name": "bench", "context": {"cluster": "bench", "user": "bench"}}],
+            "current-context": "bench",
+        }, kubeconfig)
+    return path
+
+
+def measure(case, size, docker_engine, kube_api, env, timeout):
+    """Seed the fakes, run a case in a fresh interpreter and return its measurements"""
+    docker_engine.seed(size)
+    kube_api.seed(size)
+    process = subprocess.run([sys.executable, os.path.join(BENCHMARKS, "scale.py"), "--child", case,
+                              "--size", str(size)],
+                             cwd=REPO_ROOT, env=env, capture_output=True, text=True, timeout=timeout)
+    backend = docker_engine if case.startswith("docker.") else kube_api
+    if process.returncode != 0:
+        lines = process.stderr.strip().splitlines()
+        return {"case": case, "size": size, "error": lines[-1] if lines else f"exit status {process.returncode}"}
+    result = json.loads(process.stdout.strip().splitlines()[-1])
+    result.update(case=case, size=size, requests=backend.requests)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="comma-separated inventory sizes")
+    parser.add_argument("--cases", default=",".join(CASES), help="comma-separated cases to run")
+    parser.add_argument("--timeout", type=int, default=CASE_TIMEOUT, help="seconds allowed per case")
+    parser.add_argument("--json", help="also write the results to this file")
+    parser.add_argument("--child", choices=CASES, help=argparse.SUPPRESS)
+    parser.add_argument("--size", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.size)
+        return
+
+    cases = [case.strip() for case in args.cases.split(",") if case.strip()]
+    unknown = [case for case in cases if case not in CASES]
+    if unknown:
+        parser.error(f"unknown case(s): {', '.join(unknown)}")
+    sizes = [int(size) for size in args.sizes.split(",")]
+
+    sys.path[:0] = [REPO_ROOT]
+    from benchmarks.fake_docker import FakeDockerEngine
+    from benchmarks.fake_kube import FakeKubeApiServer
+
+    docker_engine = FakeDockerEngine()
+    kube_api = FakeKubeApiServer()
+    results = []
+    with tempfile.TemporaryDirectory(prefix="scale-bench-") as directory:
+        env = dict(os.environ, DOCKER_HOST=docker_engine.start(),
+                   KUBECONFIG=write_kubeconfig(directory, kube_api.start()))
+        env.pop("DOCKER_TLS_VERIFY", None)
+        try:
+            print(f"{'case':<22}{'size':>8}{'wall time':>12}{'requests':>10}{'peak RSS':>12}{'items':>8}")
+            for case in cases:
+                for size in sizes:
+                    result = measure(case, size, docker_engine, kube_api, env, args.timeout)
+                    results.append(result)
+                    if "error" in result:
+                        print(f"{case:<22}{size:>8}  failed: {result['error']}")
+                    else:
+                        items = "-" if result["items"] is None else result["items"]
+                        print(f"{case:<22}{size:>8}{result['seconds']:>10.3f} s{result['requests']:>10}"
+                              f"{result['max_rss_kb'] / 1024:>9.1f} MB{items:>8}")
+        finally:
+            docker_engine.stop()
+            kube_api.stop()
+
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump(results, output, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Measures how long the main menu takes to appear and what each subsystem import costs.
+
+Run from the repository root:
+
+    python benchmarks/startup.py [--runs 5]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MENU_BUDGET_MS = 100
+
+SUBSYSTEMS = [
+    "docker_controllers.interact",
+    "docker_controllers.orchestrate",
+    "docker_controllers.compose",
+    "k8s_controllers.pods",
+    "k8s_controllers.deployments",
+    "k8s_controllers.services",
+]
+
+
+def time_interpreter():
+    """Return the milliseconds a bare interpreter takes to start and exit"""
+    started = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "pass"], check=True)
+    return (time.perf_counter() - started) * 1000
+
+
+def time_to_menu():
+    """Start main.py and return the milliseconds until the first prompt is printed"""
+    started = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "-u", "main.py"], cwd=REPO_ROOT,
+                               stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    output = b""
+    while b"Enter your choice" not in output:
+        chunk = process.stdout.read1(4096)
+        if not chunk:
+            break
+        output += chunk
+    elapsed = (time.perf_counter() - started) * 1000
+    process.communicate(b"3\n")
+    return elapsed
+
+
+def import_cost(module):
+    """Return the cumulative import time of a module in a fresh interpreter, in milliseconds"""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=REPO_ROOT, capture_output=True, text=True)
+    if result.returncode != 0:
+        return None
+    # -X importtime prints "import time: self [us] | cumulative | name", the
+    # requested module being the last line.
+    for line in reversed(result.stderr.splitlines()):
+        fields = [field.strip() for field in line.split("|")]
+        if len(fields) == 3 and fields[2] == module:
+            return int(fields[1]) / 1000
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="number of runs to take the median of")
+    args = parser.parse_args()
+
+    baseline = statistics.median(time_interpreter() for _ in range(args.runs))
+    menu = statistics.median(time_to_menu() for _ in range(args.runs))
+
+    print(f"{'interpreter startup':<34}{baseline:>10.1f} ms")
+    print(f"{'main menu displayed':<34}{menu:>10.1f} ms  "
+          f"({'within' if menu <= MENU_BUDGET_MS else 'over'} the {MENU_BUDGET_MS} ms budget)")
+    print()
+    print(f"{'subsystem import (first menu use)':<34}{'cost':>10}")
+    for module in SUBSYSTEMS:
+        costs = [import_cost(module) for _ in range(args.runs)]
+        if None in costs:
+            print(f"{module:<34}{'failed':>10}")
+        else:
+            print(f"{module:<34}{statistics.median(costs):>10.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+import asyncio
+import json
+import os
+import threading
+from collections import deque
+from urllib.parse import urlencode, urlparse
+
+DEFAULT_HOST = "unix:///var/run/docker.sock"
+DEFAULT_POOL_SIZE = 32
+
+
+class DockerEngineError(Exception):
+    """Raised when the Docker Engine answers with an error status"""
+
+    def __init__(self, status, message):
+        super().__init__(f"{status}: {message}")
+        self.status = status
+        self.message = message
+
+
+def is_supported_host(host=None):
+    """Whether AsyncDockerEngine can reach host: a unix socket, or tcp without TLS"""
+    url = urlparse(host or os.environ.get("DOCKER_HOST") or DEFAULT_HOST)
+    if url.scheme == "unix":
+        return True
+    # docker.from_env() turns TLS on when either variable is set.
+    return url.scheme == "tcp" and not (os.environ.get("DOCKER_TLS_VERIFY") or os.environ.get("DOCKER_CERT_PATH"))
+
+
+class _Connection:
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    def close(self):
+        self.writer.close()
+
+
+class AsyncDockerEngine:
+    """Talks to the Docker Engine API over a pool of keep-alive connections"""
+
+    def __init__(self, host=None, pool_size=DEFAULT_POOL_SIZE):
+        self.host = host or os.environ.get("DOCKER_HOST") or DEFAULT_HOST
+        url = urlparse(self.host)
+        if url.scheme not in ("unix", "tcp"):
+            raise ValueError(f"Unsupported Docker host '{self.host}'")
+        self._url = url
+        self.pool_size = pool_size
+        self._idle = deque()
+        self._slots = None
+
+    async def list_containers(self, all=False, filters=None):
+        """Return the /containers/json summaries (one request, no per-container inspect)"""
+        params = {"all": int(all)}
+        if filters:
+            params["filters"] = json.dumps(filters)
+        return await self.request_json("GET", "/containers/json", params)
+
+    async def request_json(self, method, path, params=None, body=None):
+        """Send a request and decode the JSON response"""
+        _, _, data = await self.request(method, path, params, body)
+        return json.loads(data) if data else None
+
+    async def request(self, method, path, params=None, body=None):
+        """Send a request and return (status, headers, body), raising DockerEngineError on >= 400"""
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.pool_size)
+        async with self._slots:
+            connection, reused = await self._acquire()
+            try:
+                try:
+                    status, headers, data = await self._exchange(connection, method, path, params, body)
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    if not reused:
+                        raise
+                    # The engine dropped the idle keep-alive connection; try
+                    # once more on a new one.
+                    connection.close()
+                    connection, _ = await self._acquire(fresh=True)
+                    status, headers, data = await self._exchange(connection, method, path, params, body)
+            except asyncio.IncompleteReadError as ex:
+                connection.close()
+                raise ConnectionError(f"Docker Engine closed the connection mid-response: {ex}") from ex
+            except BaseException:
+                connection.close()
+                raise
+            if headers.get("connection", "").lower() == "close":
+                connection.close()
+            else:
+                self._idle.append(connection)
+
+        if status >= 400:
+            try:
+                message = json.loads(data).get("message", "")
+            except ValueError:
+                message = data.decode("utf-8", "replace")
+            raise DockerEngineError(status, message)
+        return status, headers, data
+
+    async def close(self):
+        """Close every pooled connection"""
+        while self._idle:
+            self._idle.popleft().close()
+
+    async def _acquire(self, fresh=False):
+        """Return (connection, whether it came from the pool)"""
+        while self._idle and not fresh:
+            connection = self._idle.popleft()
+            if not connection.reader.at_eof() and not connection.writer.is_closing():
+                return connection, True
+            connection.close()
+        if self._url.scheme == "unix":
+            reader, writer = await asyncio.open_unix_connection(self._url.path)
+        else:
+            reader, writer = await asyncio.open_connection(self._url.hostname, self._url.port or 2375)
+        return _Connection(reader, writer), False
+
+    async def _exchange(self, connection, method, path, params, body):
+        target = path + ("?" + urlencode(params) if params else "")
+        payload = json.dumps(body).encode() if body is not None else b""
+        head = [f"{method} {target} HTTP/1.1", "Host: docker", f"Content-Length: {len(payload)}"]
+        if body is not None:
+            head.append("Content-Type: application/json")
+        connection.writer.write(("\r\n".join(head) + "\r\n\r\n").encode() + payload)
+        await connection.writer.drain()
+
+        reader = connection.reader
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionError("Docker Engine closed the connection")
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        if status in (204, 304) or method == "HEAD":
+            data = b""
+        elif headers.get("transfer-encoding", "").lower() == "chunked":
+            data = await _read_chunked(reader)
+        elif "content-length" in headers:
+            data = await reader.readexactly(int(headers["content-length"]))
+        else:
+            data = await reader.read()
+            headers["connection"] = "close"
+        return status, headers, data
+
+
+async def _read_chunked(reader):
+    chunks = []
+    while True:
+        size = int((await reader.readline()).split(b";")[0], 16)
+        if size == 0:
+            # Skip the (normally empty) trailer section.
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+            return b"".join(chunks)
+        chunks.append(await reader.readexactly(size))
+        await reader.readexactly(2)
+
+
+class ClientEngine:
+    """SyncDockerEngine's listing through a docker-py client, for hosts the asyncio engine cannot reach"""
+
+    def __init__(self, client):
+        self.client = client
+
+    def list_containers(self, all=False, filters=None):
+        """Return the /containers/json summaries"""
+        import docker
+
+        try:
+            return self.client.api.containers(all=all, filters=filters)
+        except docker.errors.APIError as ex:
+            raise DockerEngineError(ex.status_code, ex.explanation) from ex
+
+
+class SyncDockerEngine:
+    """Blocking facade that runs an AsyncDockerEngine on a background event loop"""
+
+    def __init__(self, host=None, pool_size=DEFAULT_POOL_SIZE):
+        self.engine = AsyncDockerEngine(host, pool_size)
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True, name="docker-engine")
+        self._thread.start()
+
+    def call(self, coroutine):
+        """Run a coroutine on the engine loop and wait for its result"""
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    def list_containers(self, all=False, filters=None):
+        """Return the /containers/json summaries"""
+        return self.call(self.engine.list_containers(all, filters))
+
+    def close(self):
+        """Close the pooled connections and stop the loop"""
+        self.call(self.engine.close())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
@@ -0,0 +1,133 @@
+import fnmatch
+import glob
+import hashlib
+import io
+import json
+import os
+import shlex
+import tarfile
+
+CONTEXT_HASH_LABEL = "containermanager.context-hash"
+DOCKERFILE_NAME = "Dockerfile"
+
+
+def read_dockerignore(root):
+    """Return the patterns of root/.dockerignore (empty when there is none)"""
+    path = os.path.join(root, ".dockerignore")
+    if not os.path.exists(path):
+        return []
+    with open(path) as dockerignore:
+        lines = [line.strip() for line in dockerignore]
+    return [line for line in lines if line and not line.startswith("#")]
+
+
+def is_ignored(path, patterns):
+    """Apply .dockerignore patterns to a context-relative path; the last matching pattern wins"""
+    parts = path.split(os.sep)
+    # A pattern that matches a directory also excludes everything below it.
+    prefixes = [os.sep.join(parts[:index]) for index in range(1, len(parts) + 1)]
+    ignored = False
+    for pattern in patterns:
+        negated = pattern.startswith("!")
+        pattern = os.path.normpath(pattern.lstrip("!").strip("/"))
+        if any(_matches(prefix, pattern) for prefix in prefixes):
+            ignored = not negated
+    return ignored
+
+
+def _matches(path, pattern):
+    if fnmatch.fnmatch(path, pattern):
+        return True
+    # "**/" stands for any number of directories, including none.
+    return "**/" in pattern and fnmatch.fnmatch(path, pattern.replace("**/", ""))
+
+
+def copy_sources(dockerfile_content):
+    """Return the local source paths named by the COPY/ADD instructions of a Dockerfile"""
+    sources = []
+    # Join continuation lines before looking at instructions.
+    for line in dockerfile_content.replace("\\\n", " ").splitlines():
+        line = line.strip()
+        instruction, _, arguments = line.partition(" ")
+        if instruction.upper() not in ("COPY", "ADD"):
+            continue
+        arguments = arguments.strip()
+        if arguments.startswith("["):
+            tokens = json.loads(arguments)
+        else:
+            tokens = shlex.split(arguments)
+        flags = [token for token in tokens if token.startswith("--")]
+        if any(flag.startswith("--from") for flag in flags):
+            continue  # copies from another build stage or image
+        paths = [token for token in tokens if not token.startswith("--")][:-1]
+        sources.extend(path for path in paths if "://" not in path)
+    return sources
+
+
+class BuildContext:
+    """A deterministic in-memory tar of a Dockerfile and the files it copies"""
+
+    def __init__(self, data, files):
+        self.data = data
+        self.files = files
+        self.digest = hashlib.sha256(data).hexdigest()
+
+    @property
+    def fileobj(self):
+        """A fresh file object over the tar, for one upload"""
+        return io.BytesIO(self.data)
+
+
+class ContextBuilder:
+    """Builds minimal build contexts from a directory, honouring its .dockerignore"""
+
+    def __init__(self, root="."):
+        self.root = root
+
+    def from_dockerfile(self, dockerfile="Dockerfile"):
+        """Build the context for root/dockerfile"""
+        with open(os.path.join(self.root, dockerfile)) as dockerfile_handle:
+            content = dockerfile_handle.read()
+
+        patterns = read_dockerignore(self.root)
+        files = set()
+        for source in copy_sources(content):
+            matches = glob.glob(os.path.join(self.root, source)) or [os.path.join(self.root, source)]
+            for match in matches:
+                if os.path.isdir(match):
+                    for directory, _, names in os.walk(match):
+                        files.update(os.path.join(directory, name) for name in names)
+                elif os.path.exists(match):
+                    files.add(match)
+                else:
+                    raise FileNotFoundError(f"COPY source '{source}' does not exist")
+
+        relative = sorted(os.path.relpath(path, self.root) for path in files)
+        # The Dockerfile may live outside root; in the context it is always
+        # ./Dockerfile, where the daemon looks for it.
+        relative = [path for path in relative
+                    if path not in (DOCKERFILE_NAME, ".dockerignore") and not is_ignored(path, patterns)]
+        return BuildContext(self._tar(DOCKERFILE_NAME, content, relative), [DOCKERFILE_NAME] + relative)
+
+    def _tar(self, dockerfile, content, paths):
+        buffer = io.BytesIO()
+        with tarfile.open(fileobj=buffer, mode="w", format=tarfile.PAX_FORMAT) as tar:
+            self._add(tar, dockerfile, content.encode(), 0o644)
+            for path in paths:
+                full_path = os.path.join(self.root, path)
+                with open(full_path, "rb") as source:
+                    data = source.read()
+                mode = 0o755 if os.access(full_path, os.X_OK) else 0o644
+                self._add(tar, path, data, mode)
+        return buffer.getvalue()
+
+    def _add(self, tar, name, data, mode):
+        # Fixed metadata keeps the tar, and so its hash, identical between
+        # runs as long as the file contents are.
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        info.mode = mode
+        info.mtime = 0
+        info.uid = info.gid = 0
+        info.uname = info.gname = ""
+        tar.addfile(info, io.BytesIO(data))
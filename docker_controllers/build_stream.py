@@ -0,0 +1,142 @@
+import re
+import tarfile
+import tempfile
+import time
+
+import docker
+
+from docker_controllers.build_context import CONTEXT_HASH_LABEL
+
+CLASSIC_STEP = re.compile(r"^Step (\d+)/(\d+) : (.*)$")
+CLASSIC_BUILT = re.compile(r"^Successfully built ([0-9a-f]+)$")
+BUILDKIT_STEP = re.compile(r"^#(\d+) (\[.*?\] .*)$")
+BUILDKIT_CACHED = re.compile(r"^#(\d+) CACHED$")
+BUILDKIT_DONE = re.compile(r"^#(\d+) (?:DONE|ERROR)")
+
+
+class StepTimer:
+    """Records wall time and cache hits for the steps of a build as its output streams in"""
+
+    def __init__(self, on_step=None):
+        self.on_step = on_step
+        self.steps = {}
+        self._order = []
+
+    def begin(self, key, name):
+        """Start timing a step"""
+        if key not in self.steps:
+            self.steps[key] = {"Step": name, "Cached": False, "Started": time.monotonic(), "Seconds": None}
+            self._order.append(key)
+
+    def cached(self, key):
+        """Mark a step as served from the layer cache"""
+        if key in self.steps:
+            self.steps[key]["Cached"] = True
+
+    def end(self, key):
+        """Stop timing a step"""
+        step = self.steps.get(key)
+        if step is not None and step["Seconds"] is None:
+            step["Seconds"] = time.monotonic() - step["Started"]
+            if self.on_step:
+                self.on_step(step)
+
+    def finish(self):
+        """Close any step still open and return all steps in order"""
+        for key in self._order:
+            self.end(key)
+        return [self.steps[key] for key in self._order]
+
+
+class StreamingBuilder:
+    """Builds images while streaming their output and timing each Dockerfile step"""
+
+    def __init__(self, client, on_line=None, on_step=None):
+        self.client = client
+        self.on_line = on_line
+        self.on_step = on_step
+
+    def build(self, context, image_name, cache_from=None):
+        """Build with the classic builder from an in-memory context; returns (image id, steps)"""
+        timer = StepTimer(self.on_step)
+        image_id = None
+        current = None
+        for chunk in self.client.api.build(fileobj=context.fileobj, custom_context=True, tag=image_name,
+                                           labels={CONTEXT_HASH_LABEL: context.digest},
+                                           cache_from=cache_from or None, rm=True, decode=True):
+            if "error" in chunk:
+                raise docker.errors.BuildError(chunk["error"].strip(), [])
+            if "aux" in chunk and "ID" in chunk["aux"]:
+                image_id = chunk["aux"]["ID"]
+            for line in chunk.get("stream", "").splitlines():
+                line = line.strip()
+                if not line:
+                    continue
+                self._emit(line)
+                match = CLASSIC_STEP.match(line)
+                if match:
+                    # A new step header also marks the end of the previous step.
+                    if current is not None:
+                        timer.end(current)
+                    current = int(match.group(1))
+                    timer.begin(current, match.group(3))
+                elif line == "---> Using cache" and current is not None:
+                    timer.cached(current)
+                elif image_id is None and CLASSIC_BUILT.match(line):
+                    image_id = CLASSIC_BUILT.match(line).group(1)
+        return image_id, timer.finish()
+
+    def buildx(self, context, image_name, cache_from=None, cache_to=None):
+        """Build with BuildKit, importing/exporting the layer cache; returns (image id, steps)"""
+        from python_on_whales import DockerClient
+        from python_on_whales.exceptions import DockerException
+
+        timer = StepTimer(self.on_step)
+        with tempfile.TemporaryDirectory() as context_dir:
+            # buildx wants the context on disk; unpack the minimal context
+            # rather than pointing it at the whole working directory.
+            with tarfile.open(fileobj=context.fileobj) as tar:
+                tar.extractall(context_dir)
+
+            try:
+                logs = DockerClient().buildx.build(context_dir, tags=[image_name], load=True,
+                                                   labels={CONTEXT_HASH_LABEL: context.digest},
+                                                   cache_from=cache_from, cache_to=cache_to,
+                                                   progress="plain", stream_logs=True)
+                for line in logs:
+                    line = line.rstrip()
+                    self._emit(line)
+                    self._track_buildkit(timer, line)
+            except DockerException as ex:
+                raise docker.errors.BuildError(str(ex), []) from ex
+
+        image_id = self.client.images.get(image_name).id
+        return image_id, timer.finish()
+
+    def _track_buildkit(self, timer, line):
+        match = BUILDKIT_STEP.match(line)
+        if match:
+            # BuildKit runs independent steps in parallel, so each one is
+            # tracked by its vertex number rather than by order.
+            timer.begin(int(match.group(1)), match.group(2))
+            return
+        match = BUILDKIT_CACHED.match(line)
+        if match:
+            timer.cached(int(match.group(1)))
+            return
+        match = BUILDKIT_DONE.match(line)
+        if match:
+            timer.end(int(match.group(1)))
+
+    def _emit(self, line):
+        if self.on_line:
+            self.on_line(line)
+
+
+def print_steps(steps):
+    """Print the per-step timing table of a build"""
+    print(f"\n{'Seconds':>8}  {'Cache':<6} Step")
+    for step in steps:
+        print(f"{step['Seconds']:>8.2f}  {'hit' if step['Cached'] else 'miss':<6} {step['Step']}")
+    cached = sum(step["Cached"] for step in steps)
+    print(f"{cached}/{len(steps)} steps served from cache.")
@@ -1,22 +1,43 @@
-from python_on_whales import DockerClient
+from docker_controllers.compose_engine import ComposeEngine, compose_client, print_ready
 
 
 def start_docker_compose():
     compose_file = input("Enter docker compose filename: ").strip() 
-    docker = DockerClient(compose_files=[
-            f"./{compose_file}"
-        ])
     print("starting up docker compose containers ...")
-    docker.compose.up(detach=True)
-    print("Docker Compose started successfully.")
+    report = compose_up(compose_file, on_ready=print_ready)
+    ready = all(result["Ready"] for result in report["services"].values())
+    if ready:
+        print(f"Docker Compose started successfully, stack ready after {report['seconds']:.2f}s.")
+    else:
+        print(f"Docker Compose started with errors after {report['seconds']:.2f}s.")
 
 def stop_docker_compose():
     compose_file = input("Enter docker compose filename: ").strip()
-    docker = DockerClient(compose_files=[
-            f"./{compose_file}"
-        ])
     print("stopping docker compose containers ...")
-    docker.compose.down(timeout=1)
+    compose_down(compose_file)
+
+def reconcile_docker_compose():
+    compose_file = input("Enter docker compose filename: ").strip()
+    print("reconciling docker compose containers ...")
+    report = compose_reconcile(compose_file, on_ready=print_ready)
+    if report["unchanged"]:
+        print(f"Unchanged: {', '.join(report['unchanged'])}")
+    if report["recreated"]:
+        print(f"Recreated: {', '.join(report['recreated'])} in {report['seconds']:.2f}s")
+    else:
+        print("Everything is up to date.")
+
+def compose_up(compose_file, on_ready=None):
+    "starts the services of a compose file in dependency order and waits until they are ready"
+    return ComposeEngine(compose_file).up(on_ready=on_ready)
+
+def compose_reconcile(compose_file, on_ready=None):
+    "recreates only the services of a compose file whose configuration or image changed"
+    return ComposeEngine(compose_file).reconcile(on_ready=on_ready)
+
+def compose_down(compose_file):
+    "stops and removes the services of a compose file"
+    compose_client(compose_file).compose.down(timeout=1)
 
 def dockercompose():
     "provides an interactive menu for running composed docker containers"
@@ -25,7 +46,8 @@ def dockercompose():
         print("\nSelect a 'Docker Compose' Action")
         print("1. Start Docker Compose Containers")
         print("2. Stop Docker Compose Containers")
-        print("3. Back to 'Docker Actions' Menu")
+        print("3. Reconcile Docker Compose Containers")
+        print("4. Back to 'Docker Actions' Menu")
         
         choice = input("\nEnter your choice: ")
         if choice == "1":
@@ -33,6 +55,8 @@ def dockercompose():
         elif choice == "2":
             stop_docker_compose()
         elif choice == "3":
+            reconcile_docker_compose()
+        elif choice == "4":
             break
         else:
             print("Invalid choice. Please select a valid option.")
\ No newline at end of file
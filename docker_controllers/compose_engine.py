@@ -0,0 +1,310 @@
+import contextlib
+import functools
+import hashlib
+import json
+import os
+import re
+import tempfile
+import time
+
+import docker
+import requests
+from python_on_whales import DockerClient
+from python_on_whales.exceptions import DockerException
+
+try:
+    import yaml
+except ImportError:  # without it every depends_on waits for readiness
+    yaml = None
+
+import metrics
+from docker_controllers.readiness import ReadinessWaiter
+from taskgraph import check_graph, run_graph
+
+DEFAULT_TIMEOUT = 300
+CONFIG_HASH_LABEL = "containermanager.config-hash"
+PROJECT_LABEL = "com.docker.compose.project"
+SERVICE_LABEL = "com.docker.compose.service"
+
+SERVICE_STARTED = "service_started"
+SERVICE_HEALTHY = "service_healthy"
+SERVICE_COMPLETED = "service_completed_successfully"
+CONDITIONS = (SERVICE_STARTED, SERVICE_HEALTHY, SERVICE_COMPLETED)
+# A dependency declared without a condition waits for the dependency's health
+# check or published port, not just for it to have started.
+SERVICE_READY = "service_ready"
+
+
+@functools.lru_cache(maxsize=None)
+def compose_client(compose_file):
+    """Return the (shared) python_on_whales client for a compose file"""
+    return DockerClient(compose_files=[f"./{compose_file}"])
+
+
+def project_name(compose_file, config):
+    """Return the compose project name, as `docker compose` derives it when the file does not set one"""
+    name = config.get("name") or os.environ.get("COMPOSE_PROJECT_NAME")
+    if not name:
+        name = os.path.basename(os.path.dirname(os.path.abspath(compose_file)))
+    return re.sub(r"[^a-z0-9_-]", "", name.lower())
+
+
+def declared_conditions(compose_file):
+    """Return {service: dependencies given an explicit condition} from a compose file, or None if unreadable"""
+    if yaml is None:
+        return None
+    try:
+        with open(compose_file) as raw_file:
+            document = yaml.safe_load(raw_file) or {}
+    except (OSError, yaml.YAMLError):
+        return None
+    declared = {}
+    for name, service in (document.get("services") or {}).items():
+        depends_on = (service or {}).get("depends_on") or {}
+        if isinstance(depends_on, dict):
+            declared[name] = {dependency for dependency, options in depends_on.items()
+                              if isinstance(options, dict) and "condition" in options}
+    return declared
+
+
+def dependency_graph(config, declared=None):
+    """Map every service of a `compose config` document to {dependency: depends_on condition}
+
+    `compose config` writes service_started for dependencies without a
+    condition; unless declared (see declared_conditions()) says it was
+    written in the file, those wait for readiness (SERVICE_READY) instead.
+    """
+    services = config.get("services") or {}
+    graph = {}
+    for name, service in services.items():
+        depends_on = service.get("depends_on") or {}
+        # `compose config` normalises the list form to a mapping, but accept
+        # both in case a raw file is passed in.
+        if not isinstance(depends_on, dict):
+            depends_on = {dependency: {} for dependency in depends_on}
+        graph[name] = {}
+        for dependency in sorted(depends_on):
+            if dependency not in services:
+                raise ValueError(f"service '{name}' depends on undefined service '{dependency}'")
+            condition = (depends_on[dependency] or {}).get("condition", SERVICE_STARTED)
+            if condition not in CONDITIONS:
+                raise ValueError(f"service '{name}' depends on '{dependency}' with unsupported condition '{condition}'")
+            if condition == SERVICE_STARTED and dependency not in (declared or {}).get(name, ()):
+                condition = SERVICE_READY
+            graph[name][dependency] = condition
+    return graph
+
+
+class ComposeEngine:
+    """Starts a compose project service by service, as soon as each one's depends_on conditions are met"""
+
+    def __init__(self, compose_file, timeout=DEFAULT_TIMEOUT):
+        self.compose_file = compose_file
+        self.docker = compose_client(compose_file)
+        self.client = metrics.instrument_docker(docker.from_env())
+        self.readiness = ReadinessWaiter(self.client, timeout=timeout)
+
+    def config(self):
+        """Return the effective configuration of the project"""
+        return self.docker.compose.config(return_json=True)
+
+    def up(self, on_ready=None):
+        """Start every service, returning {"services": {name: result}, "seconds": total}"""
+        started = time.monotonic()
+        config = self.config()
+        graph = dependency_graph(config, declared_conditions(self.compose_file))
+        check_graph(graph, "service")  # rejects cycles before anything is started
+
+        # The hashes include the image ids, so the images have to be present
+        # first; `create` would otherwise pull them after the hashing.
+        self.ensure_images(config)
+
+        # Creating every container (and the project network) in one call
+        # leaves only the cheap, race-free `start` to the per-service workers.
+        # The containers are labelled with their config hash for reconcile().
+        hashes = {name: self.service_hash(service) for name, service in config["services"].items()}
+        with self.labelled(hashes) as client:
+            client.compose.create()
+
+        # Each service is two nodes: its start, and it becoming ready (or, for
+        # services others wait on to complete, exiting). A dependent needs the
+        # dependency's start for an explicit service_started and its
+        # readiness otherwise.
+        awaited_exit = {dependency for dependencies in graph.values()
+                        for dependency, condition in dependencies.items() if condition == SERVICE_COMPLETED}
+        nodes = {}
+        for name, dependencies in graph.items():
+            nodes[(name, "start")] = [(dependency, "start" if condition == SERVICE_STARTED else "ready")
+                                      for dependency, condition in dependencies.items()]
+            nodes[(name, "ready")] = [(name, "start")]
+
+        def run(node, results):
+            name, stage = node
+            if stage == "start":
+                unmet = []
+                for dependency, condition in graph[name].items():
+                    error = condition_error(condition, results, dependency)
+                    if error:
+                        unmet.append(f"{dependency} {error}")
+                if unmet:
+                    return {"Started": False, "Error": f"dependency {', '.join(unmet)}"}
+                return self.start_service(name)
+
+            start = results[(name, "start")]
+            if not start["Started"]:
+                result = {"Ready": False, "Method": None, "Error": start["Error"]}
+            elif name in awaited_exit:
+                result = self.wait_completed(name)
+            else:
+                result = self.wait_service(name)
+            result["Seconds"] = time.monotonic() - started
+            if on_ready:
+                on_ready(name, result)
+            return result
+
+        results = run_graph(nodes, run)
+        return {"services": {name: results[(name, "ready")] for name in graph}, "seconds": time.monotonic() - started}
+
+    def reconcile(self, on_ready=None):
+        """Recreate only the services whose configuration or image changed since they were started"""
+        started = time.monotonic()
+        config = self.config()
+        self.ensure_images(config)
+        desired = {name: self.service_hash(service) for name, service in (config.get("services") or {}).items()}
+        current = self.current_hashes(project_name(self.compose_file, config))
+        changed = [name for name in sorted(desired) if current.get(name) != desired[name]]
+
+        results = {}
+        if changed:
+            self._recreate(changed, desired)
+            for name in changed:
+                results[name] = self.wait_service(name)
+                results[name]["Seconds"] = time.monotonic() - started
+                if on_ready:
+                    on_ready(name, results[name])
+        return {
+            "recreated": changed,
+            "unchanged": sorted(set(desired) - set(changed)),
+            "services": results,
+            "seconds": time.monotonic() - started,
+        }
+
+    def ensure_images(self, config):
+        """Pull (or build) the images of the services that are not present locally yet"""
+        services = config.get("services") or {}
+        missing = [name for name, service in sorted(services.items())
+                   if service.get("image") and self.image_id(service["image"]) is None]
+        pulled = [name for name in missing if not services[name].get("build")]
+        built = [name for name in missing if services[name].get("build")]
+        if pulled:
+            self.docker.compose.pull(services=pulled, quiet=True)
+        if built:
+            self.docker.compose.build(services=built, quiet=True)
+
+    def image_id(self, image):
+        """Return the id of a local image, or None when it is not present"""
+        try:
+            return self.client.images.get(image).id
+        except docker.errors.ImageNotFound:
+            return None
+
+    def service_hash(self, service):
+        """Hash the effective configuration of a service together with the id of its image"""
+        image_id = self.image_id(service["image"]) if service.get("image") else None
+        document = json.dumps({"service": service, "image": image_id or ""}, sort_keys=True)
+        return hashlib.sha256(document.encode()).hexdigest()
+
+    def current_hashes(self, project):
+        """Return the config hash label of each service's running containers (None if they disagree)"""
+        filters = {"label": f"{PROJECT_LABEL}={project}"}
+        hashes = {}
+        for container in self.client.containers.list(all=True, filters=filters, sparse=True):
+            labels = container.attrs.get("Labels") or {}
+            service = labels.get(SERVICE_LABEL)
+            value = labels.get(CONFIG_HASH_LABEL) if container.attrs.get("State") == "running" else None
+            # A stopped replica or replicas from different configurations
+            # mean the service has to be recreated.
+            hashes[service] = value if hashes.get(service, value) == value else None
+        return hashes
+
+    @contextlib.contextmanager
+    def labelled(self, hashes):
+        """Yield a client whose containers carry the given per-service config hashes"""
+        # The hashes go on the containers through a throwaway override file
+        # (JSON is valid YAML), so the user's compose file is left untouched.
+        override = {"services": {name: {"labels": {CONFIG_HASH_LABEL: value}} for name, value in hashes.items()}}
+        descriptor, path = tempfile.mkstemp(prefix="containermanager-", suffix=".yml")
+        try:
+            with os.fdopen(descriptor, "w") as override_file:
+                json.dump(override, override_file)
+            yield DockerClient(compose_files=[f"./{self.compose_file}", path])
+        finally:
+            os.remove(path)
+
+    def _recreate(self, services, hashes):
+        with self.labelled({name: hashes[name] for name in services}) as client:
+            client.compose.up(services=services, detach=True, force_recreate=True, dependencies=False)
+
+    def start_service(self, name):
+        """Start the created containers of one service, returning {Started, Error}"""
+        try:
+            self.docker.compose.start(services=[name])
+        except DockerException as ex:
+            return {"Started": False, "Error": str(ex)}
+        return {"Started": True, "Error": None}
+
+    def wait_service(self, name):
+        """Wait for the containers of a started service to be ready"""
+        try:
+            containers = [self.client.containers.get(container.id)
+                          for container in self.docker.compose.ps(services=[name])]
+            if not containers:
+                return {"Ready": False, "Method": None, "Error": "no container was created"}
+            checks = [self.readiness.wait(container, None) for container in containers]
+        except (DockerException, docker.errors.APIError) as ex:
+            return {"Ready": False, "Method": None, "Error": str(ex)}
+        failed = [check for check in checks if not check["Ready"]]
+        return {
+            "Ready": not failed,
+            "Method": checks[0]["Method"],
+            "Error": failed[0]["Error"] if failed else None,
+        }
+
+    def wait_completed(self, name):
+        """Wait for the containers of a started one-shot service to exit, ready when all exit with 0"""
+        try:
+            codes = [self.client.containers.get(container.id).wait(timeout=self.readiness.timeout)["StatusCode"]
+                     for container in self.docker.compose.ps(services=[name])]
+        except (DockerException, docker.errors.APIError, requests.exceptions.RequestException) as ex:
+            return {"Ready": False, "Method": "exit code", "Error": str(ex)}
+        if not codes:
+            return {"Ready": False, "Method": "exit code", "Error": "no container was created"}
+        failed = [code for code in codes if code != 0]
+        return {
+            "Ready": not failed,
+            "Method": "exit code",
+            "Error": f"exited with code {failed[0]}" if failed else None,
+        }
+
+
+def condition_error(condition, results, dependency):
+    """Return why a finished dependency does not meet a depends_on condition, or None"""
+    if condition == SERVICE_STARTED:
+        start = results[(dependency, "start")]
+        return None if start["Started"] else f"not started: {start['Error']}"
+    ready = results[(dependency, "ready")]
+    if not ready["Ready"]:
+        state = {SERVICE_COMPLETED: "completed", SERVICE_HEALTHY: "healthy"}.get(condition, "ready")
+        return f"not {state}: {ready['Error']}"
+    if condition == SERVICE_HEALTHY and ready["Method"] != "healthcheck":
+        # as `docker compose up` refuses it
+        return "has no healthcheck"
+    return None
+
+
+def print_ready(name, result):
+    """Print the outcome of starting one service"""
+    if result["Ready"]:
+        print(f"{name}: ready after {result['Seconds']:.2f}s ({result['Method']})")
+    else:
+        print(f"{name}: not ready after {result['Seconds']:.2f}s - {result['Error']}")
@@ -0,0 +1,120 @@
+import contextlib
+import gzip
+import os
+import tempfile
+import time
+
+try:
+    import zstandard
+except ImportError:  # zstd support is optional
+    zstandard = None
+
+DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024
+
+ARCHIVE_SUFFIXES = {"none": ".tar", "gzip": ".tar.gz", "zstd": ".tar.zst"}
+
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+
+class ImageArchiver:
+    """Streams images to and from (optionally compressed) tar archives in constant memory"""
+
+    def __init__(self, client, chunk_size=DEFAULT_CHUNK_SIZE, compress_level=None):
+        self.client = client
+        self.chunk_size = chunk_size
+        self.compress_level = compress_level
+
+    def export(self, image_name, output_path, compression="none", progress=None):
+        """Save an image to output_path through a temp file that is renamed on success"""
+        if compression not in ARCHIVE_SUFFIXES:
+            raise ValueError(f"Unsupported compression '{compression}'")
+        if compression == "zstd" and zstandard is None:
+            raise ValueError("zstd compression requires the 'zstandard' package")
+
+        image = self.client.images.get(image_name)
+        directory = os.path.dirname(output_path) or "."
+        os.makedirs(directory, exist_ok=True)
+
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".", suffix=".part")
+        started = time.monotonic()
+        written = 0
+        try:
+            with os.fdopen(fd, "wb") as raw:
+                with self._open_writer(raw, compression) as out:
+                    for chunk in image.save(chunk_size=self.chunk_size):
+                        out.write(chunk)
+                        written += len(chunk)
+                        if progress:
+                            progress(written, time.monotonic() - started)
+                raw.flush()
+                os.fsync(raw.fileno())
+            os.replace(temp_path, output_path)
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.unlink(temp_path)
+            raise
+
+        return self._stats(output_path, written, os.path.getsize(output_path), started)
+
+    def load(self, archive_path, progress=None):
+        """Load an image archive into the daemon, decompressing it on the fly"""
+        started = time.monotonic()
+        state = {"read": 0}
+
+        def chunks(reader):
+            while True:
+                chunk = reader.read(self.chunk_size)
+                if not chunk:
+                    break
+                state["read"] += len(chunk)
+                if progress:
+                    progress(state["read"], time.monotonic() - started)
+                yield chunk
+
+        with open(archive_path, "rb") as raw:
+            with self._open_reader(raw) as reader:
+                # A generator body makes requests send the archive with chunked
+                # transfer encoding instead of reading it into memory first.
+                images = self.client.images.load(chunks(reader))
+
+        stats = self._stats(archive_path, state["read"], os.path.getsize(archive_path), started)
+        stats["images"] = images
+        return stats
+
+    def _open_writer(self, raw, compression):
+        if compression == "gzip":
+            level = 6 if self.compress_level is None else self.compress_level
+            return gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=level)
+        if compression == "zstd":
+            level = 3 if self.compress_level is None else self.compress_level
+            return zstandard.ZstdCompressor(level=level, threads=-1).stream_writer(raw, closefd=False)
+        return contextlib.nullcontext(raw)
+
+    def _open_reader(self, raw):
+        magic = raw.read(4)
+        raw.seek(0)
+        if magic.startswith(GZIP_MAGIC):
+            return gzip.GzipFile(fileobj=raw, mode="rb")
+        if magic.startswith(ZSTD_MAGIC):
+            if zstandard is None:
+                raise ValueError("zstd archives require the 'zstandard' package")
+            return zstandard.ZstdDecompressor().stream_reader(raw, closefd=False)
+        return contextlib.nullcontext(raw)
+
+    def _stats(self, path, tar_bytes, file_bytes, started):
+        seconds = time.monotonic() - started
+        return {
+            "path": path,
+            "tar_bytes": tar_bytes,
+            "file_bytes": file_bytes,
+            "seconds": seconds,
+            "mb_per_second": tar_bytes / (1024 * 1024) / seconds if seconds else 0.0,
+        }
+
+
+def print_progress(done, seconds):
+    """Print a single updating throughput line"""
+    megabytes = done / (1024 * 1024)
+    rate = megabytes / seconds if seconds else 0.0
+    print(f"\r{megabytes:,.0f} MB at {rate:.1f} MB/s", end="", flush=True)
@@ -2,29 +2,43 @@ import os
 
 import docker
 
+import metrics
+from docker_controllers.aio_engine import ClientEngine, DockerEngineError, SyncDockerEngine, is_supported_host
+from docker_controllers.image_io import ARCHIVE_SUFFIXES, ImageArchiver, print_progress
+from docker_controllers.ports import PortIndex
+from docker_controllers.teardown import BulkTeardown
+
 class InteractWithDockerActions:
     
     def __init__(self):
-        self.client = docker.from_env()
+        self.client = metrics.instrument_docker(docker.from_env())
+        # Read-mostly calls go through the pooled asyncio engine, which only
+        # speaks plain HTTP over unix sockets and tcp; ssh://, npipe:// and
+        # TLS hosts are listed through docker-py instead.
+        if is_supported_host():
+            self.engine = metrics.instrument_engine(SyncDockerEngine())
+        else:
+            self.engine = ClientEngine(self.client)
+        self.ports = PortIndex(self.engine)
     
     def list_all_containers(self):
         """List all containers"""
         try:
-            containers = self.client.containers.list()
+            containers = self.engine.list_containers()
             print("All Containers:")
             for container in containers:
-                print(f"Container ID: {container.id}, Name: {container.name}")
-        except docker.errors.APIError as e:
+                print(f"Container ID: {container['Id']}, Name: {container_name(container)}")
+        except (DockerEngineError, OSError) as e:
             print(f"Error: Unable to list all containers - {e}")
             
     def list_stopped_containers(self):
         """List all stopped/exited containers"""
         try:
-            stopped_containers = self.client.containers.list(filters={'status': 'exited'})
+            stopped_containers = self.engine.list_containers(filters={'status': ['exited']})
             print("Stopped/Exited Containers:")
             for container in stopped_containers:
-                print(f"Container ID: {container.id}, Name: {container.name}")
-        except docker.errors.APIError as ex:
+                print(f"Container ID: {container['Id']}, Name: {container_name(container)}")
+        except (DockerEngineError, OSError) as ex:
             print(f"Error: Unable to list stopped/exited containers - {ex}")
                 
     def run_container(self):
@@ -37,23 +51,27 @@ class InteractWithDockerActions:
 
         container_name = input("Enter a name for the container (press Enter for a random name): ").strip()
 
-        extra_params = {}
-        if not container_name:
-        # If the user didn't provide a name, let Docker generate a random one
-            extra_params['name'] = None
-        else:
-            extra_params['name'] = container_name
-
         try:
-            container = self.client.containers.run(image_name, detach=True, **extra_params)
+            # If the user didn't provide a name, let Docker generate a random one
+            container = self.start_container(image_name, container_name or None)
             print(f"Container {container.name} is running.")
         except docker.errors.APIError as ex:
             print(f"Error: Unable to run a container with {image_name} image due to - {ex}")
+
+    def start_container(self, image_name, container_name=None):
+        """Run a detached container from an image"""
+        container = self.client.containers.run(image_name, detach=True, name=container_name)
+        self.ports.invalidate()
+        return container
                 
     def view_port_mappings(self):
         """View port mappings for a specified container"""
-        # Fetch all container IDs
-        container_ids = self.get_all_container_ids()
+        # Fetch all container IDs; the same listing already carries the ports
+        try:
+            container_ids = self.get_all_container_ids()
+        except (DockerEngineError, OSError) as ex:
+            print(f"Error: Unable to list containers - {ex}")
+            return
 
         if not container_ids:
             print("No containers found.")
@@ -81,9 +99,7 @@ class InteractWithDockerActions:
                 print("Invalid input. Please enter a valid number or 'exit'.")
 
         try:
-            container = self.client.containers.get(selected_container_id)
-            ports = container.attrs['NetworkSettings']
-            ports_info = container.attrs['NetworkSettings'].get('Ports', {})
+            ports_info = self.ports.ports(selected_container_id)
 
             if ports_info:
                 print(f"\nPort mappings for Container {selected_container_id}:")
@@ -92,46 +108,84 @@ class InteractWithDockerActions:
             else:
                 print(f"\nNo port mapping found for container ID: {selected_container_id}")
 
-        except (ValueError, IndexError) as ex:
-            print(f"\nError: Invalid choice. Please enter a valid number.")
-        except docker.errors.APIError as ex:
+        except (DockerEngineError, OSError) as ex:
             print(f"\nError: Unable to fetch the port values for {selected_container_id} container due to - {ex}")
 
+    def find_container_by_port(self):
+        """Show which containers publish a host port"""
+        choice = input("\nEnter the host port (e.g. 8005 or 53/udp) or type 'exit' to leave: ").strip().lower()
+        if choice == "exit":
+            return
+
+        host_port, _, protocol = choice.partition("/")
+        if not host_port.isdigit():
+            print("Invalid input. Please enter a port number.")
+            return
+
+        try:
+            containers = self.ports.lookup(int(host_port), protocol or "tcp")
+        except (DockerEngineError, OSError) as ex:
+            print(f"Error: Unable to list containers - {ex}")
+            return
+
+        if not containers:
+            print(f"No running container publishes port {choice}.")
+        for container in containers:
+            print(f"Port {choice} is bound to Container ID: {container['Id']}, Name: {container_name(container)}")
+
     def stop_and_remove_all_containers(self):
         """Stop and remove all containers"""
-        containers = self.client.containers.list()
-        for container in containers:
-            try:
-                print(f"Stopping and removing {container} container")
-                container.stop()
-                container.remove()
-                print(f"{container} container stopped and removed.")
-            except docker.errors.APIError as e:
-                print(f"Error occurred while stopping/removing {container} container: {e}")
-        print("All containers stopped and removed.")
+        force = input("Kill containers instead of stopping them gracefully? (y/N): ").strip().lower() == "y"
+        timeout = 10
+        if not force:
+            timeout_choice = input("Enter the stop timeout in seconds (press Enter for 10): ").strip()
+            if timeout_choice.isdigit():
+                timeout = int(timeout_choice)
+
+        try:
+            print("Stopping and removing all containers ...")
+            summary = self.remove_all_containers(timeout=timeout, force=force)
+        except docker.errors.APIError as ex:
+            print(f"Error: Unable to list containers - {ex}")
+            return
+
+        BulkTeardown.print_summary(summary)
+
+    def remove_all_containers(self, timeout=10, force=False):
+        """Stop and remove every running container concurrently, returning a summary"""
+        # Sparse objects skip the inspect request docker-py otherwise makes per container.
+        containers = self.client.containers.list(sparse=True)
+        summary = BulkTeardown(self.client, timeout=timeout, force=force).teardown(containers)
+        self.ports.invalidate()
+        return summary
     
     def save_image_to_tar(self):
-        """Save an image to a tar file"""
+        """Save an image to a (optionally compressed) tar file"""
 
         image_name = input("Enter the image name or type 'exit' to leave: ").strip().lower()
         if image_name == "exit":
             return
         
-        output_filename =input("Enter the output filename or type 'exit' to leave: ").strip().lower()
-        if output_filename =="exit":
+        output_filename =input("Enter the output filename or type 'exit' to leave: ").strip()
+        if output_filename.lower() =="exit":
+            return
+
+        compression = input("Enter the compression (none, gzip or zstd; press Enter for none): ").strip().lower() or "none"
+        if compression not in ARCHIVE_SUFFIXES:
+            print(f"Error: Unsupported compression '{compression}'.")
             return
-        try: 
-            image = self.client.images.get(image_name)
-            output_folder = "container_images" 
-            output_filename = os.path.join(output_folder, f"{image_name}.tar")
 
-            if not os.path.exists(output_folder):
-                os.makedirs(output_folder) 
+        if not output_filename:
+            output_filename = image_name.replace("/", "_").replace(":", "_")
+        if not output_filename.endswith(ARCHIVE_SUFFIXES[compression]):
+            output_filename += ARCHIVE_SUFFIXES[compression]
+        if not os.path.dirname(output_filename):
+            output_filename = os.path.join("container_images", output_filename)
 
-            with open(output_filename, 'wb') as f:
-                for chunk in image.save():
-                    f.write(chunk)
-            print(f"Image {image_name} saved to {output_filename}")
+        try: 
+            stats = ImageArchiver(self.client).export(image_name, output_filename, compression, progress=print_progress)
+            print(f"\nImage {image_name} saved to {output_filename} "
+                  f"({stats['file_bytes'] / (1024 * 1024):,.1f} MB, {stats['mb_per_second']:.1f} MB/s)")
         except docker.errors.APIError as ex:
             print(f"Error: unable to fetch the image due to - {ex}")
             print("Please enter a valid image name or type 'exit' to leave.")
@@ -139,12 +193,34 @@ class InteractWithDockerActions:
             print(f"Error: Unable to save the image locally due to - {ex}")
             return 
 
+    def load_image_from_tar(self):
+        """Load an image from a (optionally compressed) tar file"""
+
+        archive_path = input("Enter the archive path (e.g. container_images/nginx.tar) or type 'exit' to leave: ").strip()
+        if archive_path.lower() == "exit":
+            return
+
+        try:
+            stats = ImageArchiver(self.client).load(archive_path, progress=print_progress)
+            print(f"\nLoaded {archive_path} ({stats['mb_per_second']:.1f} MB/s)")
+            for image in stats["images"]:
+                print(f"Image: {', '.join(image.tags) or image.short_id}")
+        except docker.errors.APIError as ex:
+            print(f"Error: Unable to load the image due to - {ex}")
+        except Exception as ex:
+            print(f"Error: Unable to read the archive due to - {ex}")
+
     def get_all_container_ids(self):
         """Get a list of all container IDs"""
-        container_ids = [container.id for container in self.client.containers.list()]
+        container_ids = [container['Id'] for container in self.ports.containers()]
         return container_ids
 
 
+def container_name(container):
+    """Return the name of a container from its /containers/json summary"""
+    names = container.get('Names') or ['']
+    return names[0].lstrip('/')
+
 
 def interactwithdocker():
     "provides an interactive menu for interacting with Docker containers"
@@ -157,7 +233,9 @@ def interactwithdocker():
         print("4. View Port Mappings")
         print("5. Stop and Remove all Containers")
         print("6. Save Image to File")
-        print("7. Back to 'Docker Actions' Menu")
+        print("7. Load Image from File")
+        print("8. Find Container by Host Port")
+        print("9. Back to 'Docker Actions' Menu")
         
         choice = input("\nEnter your choice: ")
         if choice == "1":
@@ -173,6 +251,10 @@ def interactwithdocker():
         elif choice == "6":
             action.save_image_to_tar()
         elif choice == "7":
+            action.load_image_from_tar()
+        elif choice == "8":
+            action.find_container_by_port()
+        elif choice == "9":
             break
         else:
             print("Invalid choice. Please select a valid option.")
@@ -1,11 +1,19 @@
 import os
+import textwrap
+import time
 
 import docker
 
+import metrics
+from docker_controllers.build_context import CONTEXT_HASH_LABEL, ContextBuilder
+from docker_controllers.build_stream import StreamingBuilder, print_steps
+from docker_controllers.readiness import LogBuffer, ReadinessWaiter
+from docker_controllers.replicas import DEFAULT_PORT_RANGE, PortAllocator, ReplicaFanout, parse_port_range
+
 class OrchestrateDockerActions:
     
     def __init__(self):
-        self.client = docker.from_env()
+        self.client = metrics.instrument_docker(docker.from_env())
     
     def orchestrate_docker_operations(self):
         """Orchestrating docker operations"""
@@ -20,59 +28,119 @@ class OrchestrateDockerActions:
         if python_version == "exit":
             return
     
+        buildkit = input("Build with BuildKit? (y/N): ").strip().lower() == "y"
+        if buildkit:
+            cache_from = input("Enter the cache to import (e.g. type=local,src=/tmp/cache; press Enter to skip): ").strip() or None
+            cache_to = input("Enter where to export the cache (e.g. type=local,dest=/tmp/cache; press Enter to skip): ").strip() or None
+        else:
+            cache_from = [ref.strip() for ref in input("Enter images to use as cache sources, comma separated (press Enter to skip): ").split(",") if ref.strip()]
+            cache_to = None
+    
         self.create_dockerfile(path_to_program, python_version)
-        image = self.build_image(image_name )
+        image = self.build_image(image_name, buildkit=buildkit, cache_from=cache_from, cache_to=cache_to)
         self.run_and_manage_container(image)
 
-    def create_dockerfile(self, path_to_program, python_version):
+    def create_dockerfile(self, path_to_program, python_version, path="Dockerfile"):
         """Create a Dockerfile based on user inputs"""
         print("\nCreating dockerfile ...")
-        dockerfile_content = f"""
+        dockerfile_content = textwrap.dedent(f"""\
         FROM python:{python_version}
         WORKDIR /app
         COPY {path_to_program} /app
         EXPOSE 8000
-        CMD ["python", "{path_to_program}"]"  
-        """
-        with open("Dockerfile", "w") as dockerfile:
+        CMD ["python", "{path_to_program}"]
+        """)
+        with open(path, "w") as dockerfile:
             dockerfile.write(dockerfile_content)
         print("Dockerfile created successfully.")
     
-    def build_image(self, image_name):
+    def build_image(self, image_name, buildkit=False, cache_from=None, cache_to=None, dockerfile="Dockerfile"):
         """Build a Docker image from the Dockerfile"""
         print(f"Building the {image_name} image")
         try:
-            image = self.client.images.build(path=".", tag=image_name)
+            # Only the Dockerfile and the files it copies are uploaded, not
+            # the whole working directory.
+            context = ContextBuilder(".").from_dockerfile(dockerfile)
+            image = self.find_image_for_context(context.digest)
+            if image is not None:
+                image.tag(image_name)
+                print(f"Build context unchanged, reusing image {image.short_id} as '{image_name}'.")
+                return image
+
+            # Build output is printed as it arrives, followed by the time and
+            # cache status of every step.
+            builder = StreamingBuilder(self.client, on_line=print)
+            if buildkit:
+                image_id, steps = builder.buildx(context, image_name, cache_from=cache_from, cache_to=cache_to)
+            else:
+                image_id, steps = builder.build(context, image_name, cache_from=cache_from)
+            print_steps(steps)
+
+            image = self.client.images.get(image_id or image_name)
             print(f"Image '{image_name}' created successfully.")
             print("here is the created image", image)
-            return image[0]
+            return image
+        except OSError as ex:
+            print(f"Error occurred while preparing the build context: {ex}")
         except docker.errors.BuildError as ex:
             print(f"Error occurred while building the image: {ex}")
         except docker.errors.APIError as ex:
             print(f"Error occurred due to Docker API issue: {ex}")
+
+    def find_image_for_context(self, digest):
+        """Return an image previously built from a context with this hash, if any"""
+        images = self.client.images.list(filters={"label": f"{CONTEXT_HASH_LABEL}={digest}"})
+        return images[0] if images else None
     
-    def run_and_manage_container(self, image):
+    def run_and_manage_container(self, image, host_port=8005, timeout=60, log_lines=200, log_since=None):
         """Run a container and manage its state"""
         try:
-            container = self.client.containers.run(image, detach=True, ports={'8000/tcp': 8005})
+            container = self.client.containers.run(image, detach=True, ports={'8000/tcp': host_port})
             print(f"Container '{container.name}' is running.")
+
+            # Follow the log while waiting, keeping only the last log_lines
+            # lines however much the container writes.
+            logs = LogBuffer(container, max_lines=log_lines, tail=log_lines, since=log_since).follow()
+            try:
+                # Wait for the health check or the published port instead of
+                # a fixed delay.
+                readiness = ReadinessWaiter(self.client, timeout=timeout).wait(container)
+            finally:
+                lines = logs.stop()
+            if readiness["Ready"]:
+                print(f"Container ready after {readiness['Seconds']:.2f}s ({readiness['Method']}).")
+            else:
+                print(f"Container not ready: {readiness['Error']}")
     
-            # Pause the container
-            container.pause()
-            print("Container paused.")
-    
-            # Unpause the container after 5 seconds
-            import time
-            time.sleep(5)
-            container.unpause()
-            print("Container unpaused.")
-    
-            # Print container logs/output
-            print(container.logs().decode('utf-8'))
+            # Print the last lines of the container logs/output
+            for line in lines:
+                print(line)
+            return readiness
         except docker.errors.APIError as ex:
             print(f"Error occurred while running the container: {ex}")
+
+    def run_replicas(self):
+        """Run several replicas of an image, each published on its own host port"""
+        image_name = input("\nEnter the image or type 'exit' to leave: ").strip().lower()
+        if image_name == "exit":
+            return
+
+        count = input(f"Enter the number of replicas (press Enter for {os.cpu_count()}): ").strip()
+        port_range = input(f"Enter the host port range (press Enter for {DEFAULT_PORT_RANGE[0]}-{DEFAULT_PORT_RANGE[1]}): ").strip()
+        try:
+            replicas = int(count) if count else None
+            first, last = parse_port_range(port_range)
+        except ValueError as ex:
+            print(f"Invalid input: {ex}")
+            return
+
+        print(f"Starting replicas of {image_name} ...")
+        started = time.monotonic()
+        results = ReplicaFanout(self.client, PortAllocator(first, last)).run(image_name, replicas)
+        ReplicaFanout.print_summary(results, time.monotonic() - started)
         
 
+
 def orchestratedocker():
     "provides an interactive menu for orchestrating Docker containers"
     
@@ -80,12 +148,15 @@ def orchestratedocker():
     while True:
         print("\nSelect an 'Orchestration' Action")
         print("1. Build and Run a Container Image")
-        print("2. Back to 'Docker Actions' Menu")
+        print("2. Run Replicas of an Image")
+        print("3. Back to 'Docker Actions' Menu")
         
         choice = input("\nEnter your choice: ")
         if choice == "1":
             action.orchestrate_docker_operations()
         elif choice == "2":
+            action.run_replicas()
+        elif choice == "3":
             break
         else:
             print("Invalid choice. Please select a valid option.")
@@ -0,0 +1,70 @@
+import threading
+import time
+
+DEFAULT_TTL = 5
+
+
+def port_mappings(container):
+    """Return a container summary's ports in the inspect 'NetworkSettings.Ports' shape"""
+    mappings = {}
+    for port in container.get("Ports") or []:
+        key = f"{port['PrivatePort']}/{port.get('Type', 'tcp')}"
+        mappings.setdefault(key, None)
+        if port.get("PublicPort"):
+            if mappings[key] is None:
+                mappings[key] = []
+            mappings[key].append({"HostIp": port.get("IP", ""), "HostPort": str(port["PublicPort"])})
+    return mappings
+
+
+class PortIndex:
+    """Caches every container's port bindings, with a host-port reverse lookup, from one listing"""
+
+    def __init__(self, engine, ttl=DEFAULT_TTL, all=False):
+        self.engine = engine
+        self.ttl = ttl
+        self.all = all
+        self._containers = {}
+        self._by_host_port = {}
+        self._fetched_at = None
+        self._lock = threading.Lock()
+
+    def containers(self):
+        """Return the container summaries, in listing order"""
+        self._ensure_fresh()
+        return list(self._containers.values())
+
+    def ports(self, container_id):
+        """Return the port mappings of a container"""
+        self._ensure_fresh()
+        container = self._containers.get(container_id)
+        return port_mappings(container) if container else {}
+
+    def lookup(self, host_port, protocol="tcp"):
+        """Return the summaries of the containers publishing a host port"""
+        self._ensure_fresh()
+        return [self._containers[container_id]
+                for container_id in self._by_host_port.get((int(host_port), protocol), [])]
+
+    def invalidate(self):
+        """Force the next call to list the containers again"""
+        with self._lock:
+            self._fetched_at = None
+
+    def _ensure_fresh(self):
+        with self._lock:
+            if self._fetched_at is not None and time.monotonic() - self._fetched_at < self.ttl:
+                return
+            containers = self.engine.list_containers(all=self.all)
+            by_host_port = {}
+            for container in containers:
+                for port in container.get("Ports") or []:
+                    if not port.get("PublicPort"):
+                        continue
+                    owners = by_host_port.setdefault((port["PublicPort"], port.get("Type", "tcp")), [])
+                    # IPv4 and IPv6 bindings of the same port show up separately.
+                    if container["Id"] not in owners:
+                        owners.append(container["Id"])
+            self._containers = {container["Id"]: container for container in containers}
+            self._by_host_port = by_host_port
+            self._fetched_at = time.monotonic()
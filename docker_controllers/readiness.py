@@ -0,0 +1,151 @@
+import socket
+import threading
+import time
+from collections import deque
+
+import docker
+
+DEFAULT_TIMEOUT = 60
+DEFAULT_LOG_LINES = 1000
+
+PROBE_INTERVAL = 0.05
+MAX_PROBE_INTERVAL = 0.5
+
+
+def published_port(container, container_port="8000/tcp"):
+    """Return the host port a container publishes container_port (or, if None, any tcp port) on"""
+    ports = container.attrs.get("NetworkSettings", {}).get("Ports") or {}
+    if container_port is None:
+        candidates = [port for port in sorted(ports) if port.endswith("/tcp")]
+    else:
+        candidates = [container_port]
+    for port in candidates:
+        for binding in ports.get(port) or []:
+            if binding.get("HostPort"):
+                return int(binding["HostPort"])
+    return None
+
+
+def probe_tcp(host, port, timeout=0.5):
+    """Return True when something accepts and keeps open a TCP connection on host:port"""
+    try:
+        sock = socket.create_connection((host, port), timeout=timeout)
+    except OSError:
+        # including a connect timeout: nothing is accepting yet
+        return False
+    with sock:
+        # docker-proxy accepts connections even when nothing listens in
+        # the container, then closes them straight away; an application
+        # keeps the connection open (or greets us).
+        sock.settimeout(0.2)
+        try:
+            return sock.recv(1) != b""
+        except socket.timeout:
+            return True
+        except OSError:
+            return False
+
+class ReadinessWaiter:
+    """Waits for a started container to become ready without fixed sleeps"""
+
+    def __init__(self, client, timeout=DEFAULT_TIMEOUT, probe_host="127.0.0.1"):
+        self.client = client
+        self.timeout = timeout
+        self.probe_host = probe_host
+
+    def wait(self, container, container_port="8000/tcp"):
+        """Block until the container is ready, returning {Ready, Method, Seconds, Error}"""
+        started = time.monotonic()
+        container.reload()
+        if container.attrs["State"].get("Health") is not None:
+            method = "healthcheck"
+            ready, error = self._wait_healthy(container)
+        elif published_port(container, container_port) is not None:
+            method = "tcp"
+            ready, error = self._wait_port(container, published_port(container, container_port))
+        else:
+            # Nothing to probe: a running container is as ready as we can tell.
+            method = "running"
+            ready = container.status == "running"
+            error = None if ready else f"container is {container.status}"
+        return {"Ready": ready, "Method": method, "Seconds": time.monotonic() - started, "Error": error}
+
+    def _wait_healthy(self, container):
+        deadline = time.time() + self.timeout
+        # Subscribe before looking at the current state so that a transition
+        # happening in between is not missed.
+        events = self.client.events(since=int(time.time()) - 1, until=int(deadline) + 1, decode=True,
+                                    filters={"container": container.id, "event": ["health_status", "die"]})
+        try:
+            container.reload()
+            state = container.attrs["State"]
+            if state["Health"]["Status"] == "healthy":
+                return True, None
+            if not state["Running"]:
+                return False, f"container exited with code {state['ExitCode']}"
+            for event in events:
+                status = event.get("status") or event.get("Action", "")
+                if status == "die":
+                    return False, "container exited before becoming healthy"
+                if status.endswith("unhealthy"):
+                    return False, "health check reported unhealthy"
+                if status.endswith("healthy"):
+                    return True, None
+            return False, f"not healthy after {self.timeout}s"
+        finally:
+            events.close()
+
+    def _wait_port(self, container, host_port):
+        deadline = time.monotonic() + self.timeout
+        interval = PROBE_INTERVAL
+        while time.monotonic() < deadline:
+            if probe_tcp(self.probe_host, host_port):
+                return True, None
+            container.reload()
+            if container.status not in ("created", "running"):
+                return False, f"container is {container.status}"
+            time.sleep(interval)
+            interval = min(interval * 2, MAX_PROBE_INTERVAL)
+        return False, f"port {host_port} not reachable after {self.timeout}s"
+
+
+class LogBuffer:
+    """Streams a container's log into a ring buffer that keeps only the last max_lines lines"""
+
+    def __init__(self, container, max_lines=DEFAULT_LOG_LINES, tail="all", since=None):
+        self.container = container
+        self.lines = deque(maxlen=max_lines)
+        self.tail = tail
+        self.since = since
+        self._stream = None
+        self._thread = None
+
+    def follow(self):
+        """Keep appending new log lines to the buffer in the background until stop()"""
+        self._stream = self.container.logs(stream=True, follow=True, tail=self.tail, since=self.since)
+        self._thread = threading.Thread(target=self._consume, args=(self._stream,), daemon=True,
+                                        name=f"logs-{self.container.short_id}")
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop following and return the buffered lines"""
+        if self._stream is not None:
+            self._stream.close()
+            self._thread.join(timeout=1)
+            self._stream = self._thread = None
+        return list(self.lines)
+
+    def _consume(self, stream):
+        partial = b""
+        try:
+            for chunk in stream:
+                lines = (partial + chunk).split(b"\n")
+                partial = lines.pop()
+                self.lines.extend(line.decode("utf-8", "replace") for line in lines)
+        except (docker.errors.APIError, OSError, AttributeError):
+            # Closing a followed stream from another thread surfaces as an
+            # error in the reading thread.
+            pass
+        if partial:
+            self.lines.append(partial.decode("utf-8", "replace"))
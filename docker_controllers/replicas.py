@@ -0,0 +1,152 @@
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import docker
+from docker.constants import DEFAULT_MAX_POOL_SIZE
+
+from docker_controllers.readiness import ReadinessWaiter
+
+DEFAULT_PORT_RANGE = (8005, 8099)
+
+
+def parse_port_range(text, default=DEFAULT_PORT_RANGE):
+    """Parse 'first-last' into a (first, last) tuple"""
+    if not text:
+        return default
+    first, _, last = text.partition("-")
+    first, last = int(first), int(last or first)
+    if not 0 < first <= last < 65536:
+        raise ValueError(f"invalid port range '{text}'")
+    return first, last
+
+
+class PortAllocator:
+    """Hands out free host ports from a range, never the same one twice"""
+
+    def __init__(self, first=DEFAULT_PORT_RANGE[0], last=DEFAULT_PORT_RANGE[1], host="0.0.0.0"):
+        self.first = first
+        self.last = last
+        self.host = host
+        self._taken = set()
+        self._lock = threading.Lock()
+
+    def allocate(self):
+        """Reserve and return a port nothing is listening on"""
+        with self._lock:
+            for port in range(self.first, self.last + 1):
+                if port not in self._taken and self._is_free(port):
+                    self._taken.add(port)
+                    return port
+        raise RuntimeError(f"no free host port left in {self.first}-{self.last}")
+
+    def release(self, port):
+        """Return a port to the pool (not one found to be in use)"""
+        with self._lock:
+            self._taken.discard(port)
+
+    def _is_free(self, port):
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+            try:
+                sock.bind((self.host, port))
+            except OSError:
+                return False
+        return True
+
+
+class ReplicaFanout:
+    """Starts many replicas of an image concurrently, each on its own host port"""
+
+    def __init__(self, client, allocator, max_workers=DEFAULT_MAX_POOL_SIZE, timeout=60):
+        # As for teardown, the worker count is capped at the docker client's
+        # connection pool size.
+        self.client = client
+        self.allocator = allocator
+        self.max_workers = max_workers
+        self.readiness = ReadinessWaiter(client, timeout=timeout)
+
+    def run(self, image, replicas=None, container_port="8000/tcp", attempts=3):
+        """Start the replicas and wait for them to be ready, returning one result per replica"""
+        replicas = replicas or os.cpu_count() or 1
+        results = []
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, replicas))) as pool:
+            futures = [pool.submit(self.start_replica, image, container_port, attempts) for _ in range(replicas)]
+            for future in as_completed(futures):
+                results.append(future.result())
+        return sorted(results, key=lambda result: result["Port"] or 0)
+
+    def start_replica(self, image, container_port="8000/tcp", attempts=3):
+        """Start one replica and wait for it to be ready, never raising"""
+        started = time.monotonic()
+        container = port = error = None
+        readiness = {"Ready": False}
+        for _ in range(attempts):
+            try:
+                port = self.allocator.allocate()
+                container = self._create_and_start(image, container_port, port)
+                break
+            except docker.errors.APIError as ex:
+                error = str(ex)
+                if "port is already allocated" not in error and "address already in use" not in error:
+                    self.allocator.release(port)
+                    port = None
+                    break
+                # Something outside our control holds the port although the
+                # bind check passed (e.g. docker-proxy on another address);
+                # it stays taken and the next attempt gets another one.
+                port = None
+            except RuntimeError as ex:
+                error = str(ex)
+                break
+
+        if container is not None:
+            try:
+                readiness = self.readiness.wait(container, container_port)
+                error = readiness["Error"]
+            except docker.errors.APIError as ex:
+                error = str(ex)
+
+        return {
+            "Name": container.name if container else None,
+            "ID": container.short_id if container else None,
+            "Port": port,
+            "Endpoint": f"http://localhost:{port}" if port else None,
+            "Ready": readiness["Ready"],
+            "Seconds": time.monotonic() - started,
+            "Error": error,
+        }
+
+    def _create_and_start(self, image, container_port, port):
+        """Create and start a container publishing container_port on port, removing it if it cannot start"""
+        try:
+            container = self.client.containers.create(image, ports={container_port: port})
+        except docker.errors.ImageNotFound:
+            # as containers.run does
+            self.client.images.pull(image)
+            container = self.client.containers.create(image, ports={container_port: port})
+        try:
+            container.start()
+        except docker.errors.APIError:
+            try:
+                container.remove(force=True)
+            except docker.errors.APIError:
+                pass
+            raise
+        return container
+
+    @staticmethod
+    def print_summary(results, elapsed):
+        """Print the endpoint and startup latency of each replica"""
+        for result in results:
+            if result["Ready"]:
+                print(f"{result['Name']}: {result['Endpoint']} ready in {result['Seconds']:.2f}s")
+            else:
+                print(f"{result['Name'] or '-'}: failed after {result['Seconds']:.2f}s - {result['Error']}")
+        ready = [result["Seconds"] for result in results if result["Ready"]]
+        print(f"\n{len(ready)}/{len(results)} replicas ready in {elapsed:.2f}s", end="")
+        if ready:
+            print(f" (fastest {min(ready):.2f}s, slowest {max(ready):.2f}s)")
+        else:
+            print()
@@ -0,0 +1,91 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import docker
+import requests
+from docker.constants import DEFAULT_MAX_POOL_SIZE
+
+
+class BulkTeardown:
+    """Stops and removes many containers concurrently"""
+
+    def __init__(self, client, max_workers=DEFAULT_MAX_POOL_SIZE, timeout=10, force=False):
+        # The worker count defaults to the docker client's connection pool size
+        # so that no worker has to open a throwaway connection to the daemon.
+        self.client = client
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.force = force
+
+    def teardown(self, containers):
+        """Tear down the given containers and prune the exited ones, returning a summary"""
+        started = time.monotonic()
+        results = []
+        if containers:
+            workers = max(1, min(self.max_workers, len(containers)))
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                futures = [pool.submit(self.teardown_container, container) for container in containers]
+                for future in as_completed(futures):
+                    results.append(future.result())
+
+        pruned, prune_error = self.prune_exited()
+        return {
+            "results": results,
+            "pruned": pruned,
+            "prune_error": prune_error,
+            "elapsed": time.monotonic() - started,
+        }
+
+    def teardown_container(self, container):
+        """Stop and remove a single container, never raising"""
+        started = time.monotonic()
+        try:
+            if self.force:
+                # A forced remove makes the daemon SIGKILL the container and
+                # delete it in the same request, skipping the grace period.
+                container.remove(force=True)
+            else:
+                container.stop(timeout=self.timeout)
+                container.remove()
+            error = None
+        except docker.errors.NotFound:
+            # Already gone (e.g. started with --rm), which is what we wanted.
+            error = None
+        except (docker.errors.APIError, requests.exceptions.RequestException) as ex:
+            # e.g. a read timeout while a slow container stops
+            error = str(ex)
+
+        return {
+            "ID": container.short_id,
+            "Name": container.name or (container.attrs.get("Names") or [""])[0].lstrip("/"),
+            "Success": error is None,
+            "Seconds": time.monotonic() - started,
+            "Error": error,
+        }
+
+    def prune_exited(self):
+        """Remove every exited container with a single prune request"""
+        try:
+            response = self.client.containers.prune()
+            return response.get("ContainersDeleted") or [], None
+        except (docker.errors.APIError, requests.exceptions.RequestException) as ex:
+            return [], str(ex)
+
+    @staticmethod
+    def print_summary(summary):
+        """Print a per-container summary of a teardown"""
+        results = sorted(summary["results"], key=lambda result: result["Name"])
+        for result in results:
+            if result["Success"]:
+                print(f"Removed {result['Name']} ({result['ID']}) in {result['Seconds']:.2f}s")
+            else:
+                print(f"Failed to remove {result['Name']} ({result['ID']}): {result['Error']}")
+
+        if summary["prune_error"]:
+            print(f"Error occurred while pruning exited containers: {summary['prune_error']}")
+        elif summary["pruned"]:
+            print(f"Pruned {len(summary['pruned'])} exited container(s).")
+
+        failed = sum(1 for result in results if not result["Success"])
+        print(f"{len(results) - failed} container(s) removed, {failed} failed "
+              f"in {summary['elapsed']:.2f}s.")
@@ -0,0 +1,98 @@
+import time
+
+from kubernetes import client, watch
+from kubernetes.client.rest import ApiException
+
+from k8s_controllers.apply import server_side_apply
+from k8s_controllers.rollout import rollout_complete, rollout_state
+from taskgraph import check_graph, run_graph
+
+DEFAULT_TIMEOUT = 600
+
+
+class GraphApplier:
+    "applies a graph of manifests concurrently, starting each one once everything it needs is ready"
+
+    def __init__(self, api_client, timeout=DEFAULT_TIMEOUT):
+        self.api_client = api_client
+        self.apps_api = client.AppsV1Api(api_client)
+        self.core_api = client.CoreV1Api(api_client)
+        self.timeout = timeout
+        self._nodes = {}
+
+    def add(self, key, manifest, needs=()):
+        "adds a manifest that is applied after the nodes in needs are ready"
+        self._nodes[key] = {"manifest": manifest, "needs": list(needs)}
+        return self
+
+    def apply(self, on_event=None):
+        "applies every node, returning the result per node and the time until all of them were ready"
+        graph = {key: node["needs"] for key, node in self._nodes.items()}
+        check_graph(graph, "resource")
+        started = time.monotonic()
+
+        def run(key, results):
+            node = self._nodes[key]
+            manifest = node["manifest"]
+            result = {"Kind": manifest["kind"], "Name": manifest["metadata"]["name"],
+                      "Applied": None, "Ready": None, "Error": "not applied"}
+            try:
+                failed = [need for need in node["needs"] if results[need]["Error"]]
+                if failed:
+                    result["Error"] = f"needs {', '.join(failed)}, which failed"
+                    return result
+                server_side_apply(self.api_client, manifest)
+                result["Applied"] = time.monotonic() - started
+                if on_event:
+                    on_event(key, "applied", result)
+                result["Error"] = self.wait_ready(manifest)
+                if result["Error"] is None:
+                    result["Ready"] = time.monotonic() - started
+            except ApiException as ex:
+                result["Error"] = f"{ex.status} {ex.reason}"
+            except Exception as ex:
+                # e.g. a dropped connection; only this node's dependents are skipped
+                result["Error"] = f"{type(ex).__name__}: {ex}"
+            finally:
+                if on_event:
+                    on_event(key, "ready" if result["Error"] is None else "failed", result)
+            return result
+
+        results = run_graph(graph, run)
+        return {"resources": results, "seconds": time.monotonic() - started}
+
+    def wait_ready(self, manifest):
+        "blocks until an applied object is ready, returning None or an error message"
+        kind = manifest["kind"]
+        name = manifest["metadata"]["name"]
+        namespace = manifest["metadata"].get("namespace", "default")
+        if kind == "Deployment":
+            return self._watch_until(self.apps_api.list_namespaced_deployment, namespace, name,
+                                     lambda deployment: rollout_complete(rollout_state(deployment)))
+        if kind == "Service" and manifest.get("spec", {}).get("selector"):
+            # A service is serving once at least one ready pod backs it.
+            return self._watch_until(self.core_api.list_namespaced_endpoints, namespace, name,
+                                     lambda endpoints: any(subset.addresses for subset in endpoints.subsets or []))
+        return None
+
+    def _watch_until(self, list_func, namespace, name, predicate):
+        deadline = time.monotonic() + self.timeout
+        while time.monotonic() < deadline:
+            watcher = watch.Watch()
+            # A new watch starts with the current state of the object, so an
+            # object that is already ready returns straight away.
+            for event in watcher.stream(list_func, namespace, field_selector=f"metadata.name={name}",
+                                        timeout_seconds=max(1, int(deadline - time.monotonic()))):
+                if event["type"] in ("ADDED", "MODIFIED") and predicate(event["object"]):
+                    watcher.stop()
+                    return None
+        return f"not ready after {self.timeout}s"
+
+def print_event(key, event, result):
+    "prints the progress of one resource of a graph apply"
+    if event == "applied":
+        print(f"{key}: applied after {result['Applied']:.2f}s")
+    elif event == "ready":
+        print(f"{key}: ready after {result['Ready']:.2f}s")
+    else:
+        print(f"{key}: failed - {result['Error']}")
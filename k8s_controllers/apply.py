@@ -0,0 +1,76 @@
+import json
+
+FIELD_MANAGER = "containermanager"
+APPLY_PATCH = "application/apply-patch+yaml"
+
+# kind -> plural resource name, for the kinds this tool manages
+RESOURCES = {
+    "ConfigMap": "configmaps",
+    "CronJob": "cronjobs",
+    "DaemonSet": "daemonsets",
+    "Deployment": "deployments",
+    "Ingress": "ingresses",
+    "Job": "jobs",
+    "Namespace": "namespaces",
+    "PersistentVolumeClaim": "persistentvolumeclaims",
+    "Pod": "pods",
+    "ReplicaSet": "replicasets",
+    "Secret": "secrets",
+    "Service": "services",
+    "ServiceAccount": "serviceaccounts",
+    "StatefulSet": "statefulsets",
+}
+CLUSTER_SCOPED = {"Namespace"}
+
+
+def resource_path(api_version, kind, namespace=None, name=None):
+    "builds the REST path of a collection or an object"
+    if kind not in RESOURCES:
+        raise ValueError(f"unsupported kind '{kind}'")
+    # The core group lives under /api, every other group under /apis.
+    path = f"/api/{api_version}" if "/" not in api_version else f"/apis/{api_version}"
+    if kind not in CLUSTER_SCOPED:
+        path += f"/namespaces/{namespace or 'default'}"
+    path += f"/{RESOURCES[kind]}"
+    if name:
+        path += f"/{name}"
+    return path
+
+
+def request_json(api_client, method, path, query_params=None, header_params=None, body=None):
+    "sends a request to a REST path through api_client and returns the decoded JSON response"
+    header_params = dict({"Accept": "application/json"}, **(header_params or {}))
+    if hasattr(api_client, "param_serialize"):
+        # kubernetes >= 37 splits call_api into serialising and sending.
+        request = api_client.param_serialize(method, path, query_params=query_params or [],
+                                             header_params=header_params, body=body, auth_settings=["BearerToken"])
+        response = api_client.call_api(*request)
+        response.read()
+        if not 200 <= response.status <= 299:
+            api_client.response_deserialize(response, {})  # raises the ApiException for the status
+    else:
+        response = api_client.call_api(
+            path, method,
+            query_params=query_params or [],
+            header_params=header_params,
+            body=body,
+            auth_settings=["BearerToken"],
+            _return_http_data_only=True,
+            _preload_content=False,
+        )
+    return json.loads(response.data)
+
+
+def server_side_apply(api_client, manifest, field_manager=FIELD_MANAGER, force=True, dry_run=False):
+    "applies a manifest with server-side apply, creating or updating it in one request"
+    metadata = manifest["metadata"]
+    path = resource_path(manifest["apiVersion"], manifest["kind"], metadata.get("namespace"), metadata["name"])
+    query = [("fieldManager", field_manager)]
+    if force:
+        # Take over fields last set by other managers (e.g. kubectl edit)
+        # instead of failing with a conflict.
+        query.append(("force", "true"))
+    if dry_run:
+        query.append(("dryRun", "All"))
+    # The client serialises the body as JSON, which is valid apply YAML.
+    return request_json(api_client, "PATCH", path, query, {"Content-Type": APPLY_PATCH}, manifest)
@@ -0,0 +1,126 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from kubernetes.client.rest import ApiException
+
+from k8s_controllers.apply import server_side_apply
+from k8s_controllers.pagination import Pager
+
+DEFAULT_WORKERS = 16
+# Whole deployments are applied as FIELD_MANAGER (services, applier,
+# manifests); under that manager this image-only configuration would drop
+# every other field it owns, so it is applied as a manager of its own.
+IMAGE_FIELD_MANAGER = "containermanager-image"
+
+
+def parse_label_selector(selector):
+    "returns the labels of an equality-only selector ('app=web,tier=front'), or None for anything else"
+    labels = {}
+    for term in filter(None, (term.strip() for term in (selector or "").split(","))):
+        key, operator, value = term.partition("=")
+        if not operator or key.endswith("!") or value.startswith("=") or " " in key:
+            return None
+        labels[key.strip()] = value.strip()
+    return labels
+
+
+def retag(current_image, version):
+    "returns version as an image: a bare tag ('1.23') is applied to the repository of current_image"
+    if ":" in version or "/" in version or "@" in version:
+        return version
+    repository = current_image.split("@")[0]
+    if ":" in repository.rsplit("/", 1)[-1]:
+        repository = repository.rsplit(":", 1)[0]
+    return f"{repository}:{version}"
+
+
+def image_patch(container_name, image):
+    "strategic-merge patch that changes the image of one container and nothing else"
+    # Containers are merged by name, so the other containers and every other
+    # field of this one are left alone.
+    return {"spec": {"template": {"spec": {"containers": [{"name": container_name, "image": image}]}}}}
+
+
+def image_apply_manifest(deployment, container_name, image):
+    "the smallest apply configuration that owns the image of one container"
+    return {
+        "apiVersion": "apps/v1",
+        "kind": "Deployment",
+        "metadata": {"name": deployment.metadata.name, "namespace": deployment.metadata.namespace},
+        "spec": {"template": {"spec": {"containers": [{"name": container_name, "image": image}]}}},
+    }
+
+
+class BulkDeploymentMutator:
+    "changes the image or replica count of many deployments concurrently with bounded parallelism"
+
+    def __init__(self, apps_api, informers=None, max_workers=DEFAULT_WORKERS):
+        self.apps_api = apps_api
+        self.informers = informers
+        self.max_workers = max_workers
+
+    def select(self, namespace=None, label_selector=None):
+        "returns the deployments in a namespace (all when None) matching a label selector"
+        labels = parse_label_selector(label_selector)
+        informer = self.informers.deployments if self.informers else None
+        if labels is not None and informer is not None and informer.wait_for_sync():
+            return informer.store.list(namespace, labels)
+
+        kwargs = {"label_selector": label_selector} if label_selector else {}
+        if namespace is None:
+            return list(Pager(self.apps_api.list_deployment_for_all_namespaces, **kwargs))
+        return list(Pager(self.apps_api.list_namespaced_deployment, namespace=namespace, **kwargs))
+
+    def set_image(self, deployments, image, container_name=None, server_side=False):
+        "points one container (the first when not named) of every deployment at a new image"
+        def mutate(deployment):
+            name = container_name or deployment.spec.template.spec.containers[0].name
+            if server_side:
+                server_side_apply(self.apps_api.api_client, image_apply_manifest(deployment, name, image),
+                                  field_manager=IMAGE_FIELD_MANAGER)
+            else:
+                self.apps_api.patch_namespaced_deployment(deployment.metadata.name, deployment.metadata.namespace,
+                                                          image_patch(name, image))
+        return self.run(deployments, mutate)
+
+    def scale(self, deployments, replicas):
+        "sets the replica count of every deployment through the scale subresource"
+        def mutate(deployment):
+            self.apps_api.patch_namespaced_deployment_scale(deployment.metadata.name, deployment.metadata.namespace,
+                                                            {"spec": {"replicas": replicas}})
+        return self.run(deployments, mutate)
+
+    def run(self, deployments, mutate):
+        "applies mutate to every deployment concurrently, returning a result per deployment"
+        if not deployments:
+            return []
+        workers = max(1, min(self.max_workers, len(deployments)))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(lambda deployment: self._mutate(deployment, mutate), deployments))
+
+    def _mutate(self, deployment, mutate):
+        started = time.monotonic()
+        try:
+            mutate(deployment)
+            error = None
+        except ApiException as ex:
+            error = f"{ex.status} {ex.reason}"
+        except Exception as ex:
+            # e.g. a connection error; it only fails this deployment
+            error = f"{type(ex).__name__}: {ex}"
+        return {
+            "Name": deployment.metadata.name,
+            "Namespace": deployment.metadata.namespace,
+            "Success": error is None,
+            "Seconds": time.monotonic() - started,
+            "Error": error,
+        }
+
+
+def print_results(results):
+    "prints a line per deployment and a summary of a bulk change"
+    for result in results:
+        status = "ok" if result["Success"] else f"failed: {result['Error']}"
+        print(f"{result['Namespace']}/{result['Name']}: {status} ({result['Seconds']:.2f}s)")
+    succeeded = sum(result["Success"] for result in results)
+    print(f"\n{succeeded}/{len(results)} deployments updated.")
@@ -0,0 +1,118 @@
+import copy
+import socket
+import threading
+
+from kubernetes import client, config
+from urllib3.connection import HTTPConnection
+
+import metrics
+from k8s_controllers.informers import InformerFactory
+from k8s_controllers.namespaces import NamespaceProvider
+
+DEFAULT_POOL_SIZE = 32
+# Every followed pod log holds a connection for as long as it is open.
+LOG_POOL_SIZE = 256
+
+
+def keepalive_socket_options():
+    "socket options that keep idle pooled connections to the api server alive"
+    options = [(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)]
+    for name, value in (("TCP_KEEPIDLE", 30), ("TCP_KEEPINTVL", 10), ("TCP_KEEPCNT", 6)):
+        if hasattr(socket, name):
+            options.append((socket.IPPROTO_TCP, getattr(socket, name), value))
+    return HTTPConnection.default_socket_options + options
+
+
+class ClientRegistry:
+    "holds the kubernetes api client and api objects shared by every controller"
+
+    def __init__(self, pool_size=DEFAULT_POOL_SIZE, configuration=None):
+        self.pool_size = pool_size
+        self._configuration = configuration
+        self._api_client = None
+        self._apis = {}
+        self._namespaces = None
+        self._lock = threading.RLock()
+
+    @property
+    def api_client(self):
+        "the pooled api client, created from the kubeconfig on first use"
+        with self._lock:
+            if self._api_client is None:
+                configuration = self._configuration
+                if configuration is None:
+                    configuration = client.Configuration()
+                    config.load_kube_config(client_configuration=configuration)
+                configuration.connection_pool_maxsize = self.pool_size
+
+                api_client = client.ApiClient(configuration)
+                # Every pool the manager creates from now on inherits these
+                # keyword arguments, so all api server connections get keep-alive.
+                pool_kw = api_client.rest_client.pool_manager.connection_pool_kw
+                pool_kw["socket_options"] = keepalive_socket_options()
+                self._api_client = metrics.instrument_kubernetes(api_client)
+            return self._api_client
+
+    @property
+    def core_api(self):
+        "the shared CoreV1Api"
+        return self._api("core", client.CoreV1Api)
+
+    @property
+    def apps_api(self):
+        "the shared AppsV1Api"
+        return self._api("apps", client.AppsV1Api)
+
+    @property
+    def namespaces(self):
+        "the shared, cached namespace provider"
+        with self._lock:
+            if self._namespaces is None:
+                self._namespaces = NamespaceProvider(self.api_client)
+            return self._namespaces
+
+    @property
+    def informers(self):
+        "the shared pod and deployment informers"
+        return self._api("informers", InformerFactory)
+
+    @property
+    def stream_api(self):
+        "a CoreV1Api on its own ApiClient for websocket (exec) calls"
+        # kubernetes.stream.stream swaps out the request method of the
+        # ApiClient it is given, which would hijack concurrent calls made by
+        # the informer threads on the shared client.
+        return self._api("stream", lambda api_client: client.CoreV1Api(client.ApiClient(api_client.configuration)))
+
+    @property
+    def log_api(self):
+        "a CoreV1Api on its own ApiClient, with a pool sized for many concurrent log streams"
+        # Long-lived log streams would otherwise hold on to the connections
+        # of the pool the other controllers share.
+        return self._api("logs", log_core_api)
+
+    def _api(self, name, api_class):
+        with self._lock:
+            if name not in self._apis:
+                self._apis[name] = api_class(self.api_client)
+            return self._apis[name]
+
+
+def log_core_api(api_client):
+    "returns a CoreV1Api on a copy of api_client whose pool holds LOG_POOL_SIZE connections"
+    configuration = copy.deepcopy(api_client.configuration)
+    configuration.connection_pool_maxsize = LOG_POOL_SIZE
+    return client.CoreV1Api(metrics.instrument_kubernetes(client.ApiClient(configuration)))
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    "returns the process-wide client registry"
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = ClientRegistry()
+        return _registry
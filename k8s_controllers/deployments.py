@@ -1,9 +1,14 @@
 import random
+import time
 
-import pandas as pd
-
-from k8s_controllers.pod import PodsActions 
-from kubernetes import client, config
+from k8s_controllers.bulk import BulkDeploymentMutator, image_patch, print_results, retag
+from k8s_controllers.clients import get_registry
+from k8s_controllers.logs import LogMultiplexer, print_line, print_summary as print_log_summary, selector_for
+from k8s_controllers.pagination import Pager
+from k8s_controllers.pods import PodsActions
+from k8s_controllers.rollout import RolloutMonitor, print_progress as print_rollout_progress
+from k8s_controllers.table import TableFormatter
+from kubernetes import client
 from kubernetes.stream import stream
 from kubernetes.client.rest import ApiException
 
@@ -11,8 +16,12 @@ from kubernetes.client.rest import ApiException
 class DeploymentActions:
     
     def __init__(self):
-        self.core_api = client.CoreV1Api()
-        self.app_api = client.AppsV1Api()
+        registry = get_registry()
+        self.core_api = registry.core_api
+        self.app_api = registry.apps_api
+        self.informers = registry.informers
+        self.log_api = registry.log_api
+        self.bulk = BulkDeploymentMutator(self.app_api, self.informers)
         self.pod = PodsActions()
         
         
@@ -29,9 +38,14 @@ class DeploymentActions:
         deployment_data = []
     
         try:
-            deployments = self.app_api.list_namespaced_deployment(selected_namespace)
-            
-            for deployment in deployments.items:
+            print("\nAvailable Deployments: \n")
+            table = TableFormatter(["#", "Name", "Replicas", "Version", "Namespace"],
+                                   widths={"#": 4, "Name": 40, "Replicas": 8, "Version": 16, "Namespace": 20})
+            table.header()
+
+            # Rows are printed as the deployments arrive instead of after the
+            # whole namespace has been fetched.
+            for index, deployment in enumerate(self.iter_deployments(selected_namespace)):
                 image_version = deployment.spec.template.spec.containers[0].image.split(":")[-1]
     
                 deployment_info = {
@@ -41,18 +55,20 @@ class DeploymentActions:
                     "Namespace": selected_namespace  # Include the namespace in the table
                 }
                 deployment_data.append(deployment_info)
+                table.row(dict(deployment_info, **{"#": index}))
     
-            # Create a DataFrame with the correct column order
-            df = pd.DataFrame(deployment_data, columns=["Name", "Replicas","Version", "Namespace"])
-    
-            # Print the information in a tabular format
-            print("\nAvailable Deployments: \n")
-            print(df)
             return deployment_data
                 
         except Exception as e:
             print(f"Error: {e}")
 
+    def iter_deployments(self, selected_namespace):
+        "Yields the deployments within a namespace, from the informer when synced or page by page otherwise"
+        informer = self.informers.deployments
+        if informer.wait_for_sync():
+            return iter(informer.store.list(selected_namespace))
+        return iter(Pager(self.app_api.list_namespaced_deployment, namespace=selected_namespace))
+
 
     def create_deployment(self):
         "creates deployment based on the image selected by the user"
@@ -143,7 +159,7 @@ class DeploymentActions:
     
             try:
                 deployment_choice = int(deployment_index)
-                if 0 <= deployment_choice <= len(deployment_list):
+                if 0 <= deployment_choice < len(deployment_list):
                     deployment_info = deployment_list[deployment_choice]
                     deployment_name = deployment_info["Name"]
                     deployment_namespace = deployment_info["Namespace"]
@@ -162,9 +178,7 @@ class DeploymentActions:
         replica_choice = input("\nEnter the number of Replicas: ").strip()
         try:
             replica_count = int(replica_choice)
-            resp = self.app_api.patch_namespaced_deployment_scale(
-                name=deployment_name, namespace=deployment_namespace, body={"spec": {"replicas": replica_count}}
-            )
+            resp = self.scale(deployment_name, deployment_namespace, replica_count)
             print(f"Deployment scaled. Replicas='{resp.spec.replicas}'")
         except Exception as ex:
             print(f"Error scaling deployment: {ex}")
@@ -175,22 +189,23 @@ class DeploymentActions:
         try:
             deployment_name, deployment_namespace = self.scale_deployment_util()
         
-            new_image_version = input("Enter new version to deploy: ").strip()
-    
-            # Get the current deployment
-            current_deployment = self.app_api.read_namespaced_deployment(name=deployment_name, namespace=deployment_namespace)
-    
-            # Update the image version in the deployment
-            current_deployment.spec.template.spec.containers[0].image = new_image_version
+            new_image_version = input("Enter new version (tag) or full image to deploy: ").strip()
+            deployment = self.get_deployment(deployment_name, deployment_namespace)
+            current_image = deployment.spec.template.spec.containers[0].image
+            rollback = input("Roll back automatically if the rollout stalls? (y/N): ").strip().lower() == "y"
     
-            # Perform the rolling update
-            resp = self.app_api.patch_namespaced_deployment(
-                name=deployment_name,
-                namespace="default",
-                body=current_deployment
-            )
+            resp = self.set_image(deployment_name, deployment_namespace, retag(current_image, new_image_version),
+                                  deployment=deployment)
     
             print(f"\nRolling update initiated for Deployment '{deployment_name}'. Status='{resp.metadata.name}'")
+
+            outcome = self.follow_rollout(deployment_name, deployment_namespace, rollback=rollback)
+            if outcome["Status"] == "complete":
+                print(f"Rollout to revision {outcome['Revision']} completed in {outcome['Seconds']:.1f}s.")
+            else:
+                print(f"Rollout {outcome['Status']} after {outcome['Seconds']:.1f}s: {outcome['Error']}")
+                if outcome["RolledBack"]:
+                    print(f"Rolled back to revision {outcome['RolledBack']}.")
     
         except ApiException as e:
             print(f"Error performing rolling update: {e}")
@@ -201,8 +216,7 @@ class DeploymentActions:
         try:
             deployment_name, deployment_namespace = self.scale_deployment_util()
     
-            # Delete the deployment
-            self.app_api.delete_namespaced_deployment(name=deployment_name, namespace=deployment_namespace)
+            self.delete(deployment_name, deployment_namespace)
     
             print(f"\nDeployment '{deployment_name}' in namespace '{deployment_namespace}' deleted successfully.")
     
@@ -210,11 +224,109 @@ class DeploymentActions:
         except ApiException as e:
             print(f"Error deleting deployment: {e}")
 
+    def scale(self, deployment_name, deployment_namespace, replicas):
+        "Sets the number of replicas of a deployment"
+        return self.app_api.patch_namespaced_deployment_scale(
+            name=deployment_name, namespace=deployment_namespace, body={"spec": {"replicas": replicas}}
+        )
+
+    def set_image(self, deployment_name, deployment_namespace, image, deployment=None):
+        "Starts a rolling update of a deployment to a new image; pass deployment when it was already read"
+        deployment = deployment or self.get_deployment(deployment_name, deployment_namespace)
+        container_name = deployment.spec.template.spec.containers[0].name
+
+        # Only the image is sent; the api server merges it into the stored object.
+        return self.app_api.patch_namespaced_deployment(
+            name=deployment_name,
+            namespace=deployment_namespace,
+            body=image_patch(container_name, image)
+        )
+
+    def follow_rollout(self, deployment_name, deployment_namespace, rollback=False):
+        "Prints the progress of a rollout until it completes or stalls, returning its outcome"
+        return RolloutMonitor(self.app_api).follow(deployment_name, deployment_namespace,
+                                                   on_progress=print_rollout_progress, rollback=rollback)
+
+    def get_deployment(self, deployment_name, deployment_namespace):
+        "Returns a deployment from the informer cache, reading it from the api server when not cached"
+        informer = self.informers.deployments
+        deployment = informer.store.get(deployment_namespace, deployment_name) if informer.has_synced else None
+        return deployment or self.app_api.read_namespaced_deployment(name=deployment_name, namespace=deployment_namespace)
+
+    def bulk_update(self):
+        "Changes the image or the replica count of every deployment matching a namespace and label selector"
+        namespace = input("\nEnter the namespace (press Enter for all namespaces) or type 'exit' to leave: ").strip()
+        if namespace.lower() == "exit":
+            return
+        label_selector = input("Enter a label selector, e.g. app=web (press Enter for all deployments): ").strip()
+
+        try:
+            deployments = self.bulk.select(namespace or None, label_selector or None)
+        except ApiException as e:
+            print(f"Error listing deployments: {e}")
+            return
+        if not deployments:
+            print("No deployments found.")
+            return
+        print(f"{len(deployments)} deployment(s) selected.")
+
+        change = input("Change the (1) image or (2) replicas? ").strip()
+        started = time.monotonic()
+        if change == "1":
+            image = input("Enter the new image (e.g. nginx:1.23): ").strip()
+            server_side = input("Use server-side apply? (y/N): ").strip().lower() == "y"
+            results = self.bulk.set_image(deployments, image, server_side=server_side)
+        elif change == "2":
+            try:
+                replicas = int(input("Enter the number of Replicas: ").strip())
+            except ValueError:
+                print("Invalid input. Please enter a valid number.")
+                return
+            results = self.bulk.scale(deployments, replicas)
+        else:
+            print("Invalid choice.")
+            return
+        print_results(results)
+        print(f"Done in {time.monotonic() - started:.2f}s.")
+
+    def tail_logs(self):
+        "Follows the logs of every pod of a deployment or label selector, merged in time order"
+        target = input("\nTail the pods of a (1) deployment or (2) label selector? ").strip()
+        try:
+            if target == "1":
+                selected = self.scale_deployment_util()
+                if not selected:
+                    return
+                deployment_name, namespace = selected
+                label_selector = selector_for(self.get_deployment(deployment_name, namespace))
+            elif target == "2":
+                namespace = input("Enter the namespace (press Enter for default): ").strip() or "default"
+                label_selector = input("Enter a label selector, e.g. app=web: ").strip()
+            else:
+                print("Invalid choice.")
+                return
+        except ApiException as e:
+            print(f"Error reading deployment: {e}")
+            return
+
+        duration = input("Follow for how many seconds? (press Enter to follow until Ctrl+C): ").strip()
+        multiplexer = LogMultiplexer(self.log_api, namespace, label_selector, self.informers)
+        print(f"\nFollowing the logs of the pods matching '{label_selector}' in '{namespace}' ...\n")
+        try:
+            summary = multiplexer.run(print_line, duration=int(duration) if duration.isdigit() else None)
+        except KeyboardInterrupt:
+            multiplexer.stop()
+            summary = multiplexer.summary()
+        print_log_summary(summary)
+
+    def delete(self, deployment_name, deployment_namespace):
+        "Deletes a deployment"
+        self.app_api.delete_namespaced_deployment(name=deployment_name, namespace=deployment_namespace)
+
 
 def manage_deployments():
     "provides an interactive menu for managing deployments"
     
-    config.load_kube_config()
     action = DeploymentActions()
     while True:
         print("\nSelect a Deployment Action")
@@ -223,7 +335,9 @@ def manage_deployments():
         print("3. Scale Deployment")
         print("4. Update Deployment")
         print("5. Delete Deployment")
-        print("6. Back to 'Docker Actions' Menu")
+        print("6. Bulk Update Deployments")
+        print("7. Tail Deployment Logs")
+        print("8. Back to 'Docker Actions' Menu")
         
         choice = input("Enter your choice: ")
         if choice == "1":
@@ -237,6 +351,10 @@ def manage_deployments():
         elif choice == "5":
            action.delete_deployment()
         elif choice == "6":
+           action.bulk_update()
+        elif choice == "7":
+           action.tail_logs()
+        elif choice == "8":
             break
         else:
             print("Invalid choice. Please select a valid option.")
@@ -0,0 +1,188 @@
+import functools
+import threading
+import time
+import uuid
+from collections import deque
+
+from kubernetes.stream import ws_client
+from kubernetes.stream.stream import _websocket_request
+
+DEFAULT_BUFFER_LIMIT = 1024 * 1024
+DEFAULT_COMMAND_TIMEOUT = 300
+
+# Same as kubernetes.stream.stream, but without capture_all, which makes the
+# websocket client keep its own copy of every byte of output forever.
+stream = functools.partial(_websocket_request, functools.partial(ws_client.websocket_call, capture_all=False), None)
+
+
+class BoundedBuffer:
+    "collects text output, keeping only the newest limit characters"
+
+    def __init__(self, limit=DEFAULT_BUFFER_LIMIT):
+        self.limit = limit
+        self.dropped = 0
+        self._chunks = deque()
+        self._size = 0
+
+    def append(self, text):
+        "adds text, discarding the oldest output when over the limit"
+        self._chunks.append(text)
+        self._size += len(text)
+        while self._size > self.limit:
+            excess = self._size - self.limit
+            oldest = self._chunks[0]
+            if len(oldest) <= excess:
+                self._chunks.popleft()
+                self._size -= len(oldest)
+                self.dropped += len(oldest)
+            else:
+                self._chunks[0] = oldest[excess:]
+                self._size -= excess
+                self.dropped += excess
+
+    def getvalue(self):
+        "returns the buffered output"
+        return "".join(self._chunks)
+
+
+class ChannelReader:
+    "splits a channel's output at a sentinel line, handing everything before it to a buffer"
+
+    def __init__(self, marker, buffer, on_output=None):
+        self.prefix = f"\n{marker}:"
+        self.buffer = buffer
+        self.on_output = on_output
+        self.exit_code = None
+        self._pending = ""
+
+    @property
+    def done(self):
+        "whether the sentinel has been seen"
+        return self.exit_code is not None
+
+    def feed(self, text):
+        "consumes a chunk of channel output"
+        self._pending += text
+        index = self._pending.find(self.prefix)
+        if index >= 0:
+            end = self._pending.find("\n", index + len(self.prefix))
+            if end < 0:
+                # The sentinel line is not complete yet; wait for the rest.
+                self._emit(self._pending[:index])
+                self._pending = self._pending[index:]
+                return
+            self._emit(self._pending[:index])
+            self.exit_code = int(self._pending[index + len(self.prefix):end] or -1)
+            self._pending = ""
+        else:
+            # Hold back just enough to recognise a sentinel split across chunks.
+            keep = len(self.prefix) - 1
+            self._emit(self._pending[:-keep] if len(self._pending) > keep else "")
+            self._pending = self._pending[-keep:] if len(self._pending) > keep else self._pending
+
+    def _emit(self, text):
+        if text:
+            self.buffer.append(text)
+            if self.on_output:
+                self.on_output(text)
+
+
+class ExecSession:
+    "a long-lived /bin/sh inside a container that runs commands one after another"
+
+    def __init__(self, core_api, pod_name, namespace, container, buffer_limit=DEFAULT_BUFFER_LIMIT):
+        self.pod_name = pod_name
+        self.namespace = namespace
+        self.container = container
+        self.buffer_limit = buffer_limit
+        self._lock = threading.Lock()
+        self._ws = stream(core_api.connect_get_namespaced_pod_exec,
+                          name=pod_name,
+                          namespace=namespace,
+                          command=["/bin/sh"],
+                          container=container,
+                          stdin=True,
+                          stdout=True,
+                          stderr=True,
+                          tty=False,
+                          _preload_content=False)
+
+    def is_open(self):
+        "whether the shell is still usable"
+        return self._ws.is_open()
+
+    def run(self, command, timeout=DEFAULT_COMMAND_TIMEOUT, on_stdout=None, on_stderr=None):
+        "runs a command in the shell and returns its exit code and bounded stdout/stderr"
+        with self._lock:
+            marker = f"__cm_done_{uuid.uuid4().hex}"
+            stdout = ChannelReader(marker, BoundedBuffer(self.buffer_limit), on_stdout)
+            stderr = ChannelReader(marker, BoundedBuffer(self.buffer_limit), on_stderr)
+
+            # Grouping keeps shell state (cd, exports) across commands, and
+            # /dev/null stops the command from eating the sentinel from stdin.
+            # The sentinel goes to both channels so neither is cut short.
+            self._ws.write_stdin(
+                f"{{ {command}\n}} </dev/null\n"
+                f"__cm_rc=$?\n"
+                f"printf '\\n%s:%d\\n' '{marker}' \"$__cm_rc\"\n"
+                f"printf '\\n%s:%d\\n' '{marker}' \"$__cm_rc\" >&2\n"
+            )
+
+            deadline = time.monotonic() + timeout
+            timed_out = False
+            while not (stdout.done and stderr.done):
+                if not self._ws.is_open():
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    timed_out = True
+                    # The shell is still busy with the command, so the session
+                    # cannot be reused.
+                    self.close()
+                    break
+                self._ws.update(timeout=min(remaining, 1))
+                out = self._ws.read_channel(ws_client.STDOUT_CHANNEL)
+                if out:
+                    stdout.feed(out)
+                err = self._ws.read_channel(ws_client.STDERR_CHANNEL)
+                if err:
+                    stderr.feed(err)
+
+            return {
+                "exit_code": stdout.exit_code,
+                "stdout": stdout.buffer.getvalue(),
+                "stderr": stderr.buffer.getvalue(),
+                "truncated": stdout.buffer.dropped + stderr.buffer.dropped > 0,
+                "timed_out": timed_out,
+            }
+
+    def close(self):
+        "closes the websocket"
+        self._ws.close()
+
+
+class ExecSessionManager:
+    "keeps one exec session open per pod container"
+
+    def __init__(self, core_api, buffer_limit=DEFAULT_BUFFER_LIMIT):
+        self.core_api = core_api
+        self.buffer_limit = buffer_limit
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def session(self, pod_name, namespace, container):
+        "returns the open session for a container, starting a new one if needed"
+        key = (namespace, pod_name, container)
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is None or not session.is_open():
+                session = ExecSession(self.core_api, pod_name, namespace, container, self.buffer_limit)
+                self._sessions[key] = session
+            return session
+
+    def close_all(self):
+        "closes every open session"
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
@@ -0,0 +1,207 @@
+import threading
+from collections import defaultdict
+
+from kubernetes import client, watch
+from kubernetes.client.rest import ApiException
+
+from k8s_controllers.pagination import Pager
+
+HTTP_GONE = 410
+
+DEFAULT_SYNC_TIMEOUT = 10
+WATCH_TIMEOUT = 300
+MAX_BACKOFF = 30
+
+
+class Store:
+    "thread-safe local cache of objects indexed by namespace, name and label"
+
+    def __init__(self):
+        self._objects = {}
+        self._by_namespace = defaultdict(set)
+        self._by_label = defaultdict(set)
+        self._lock = threading.RLock()
+
+    def replace(self, objects):
+        "replaces the whole content of the store with the given objects"
+        with self._lock:
+            self._objects.clear()
+            self._by_namespace.clear()
+            self._by_label.clear()
+            for obj in objects:
+                self.upsert(obj)
+
+    def upsert(self, obj):
+        "adds or updates an object"
+        key = (obj.metadata.namespace, obj.metadata.name)
+        with self._lock:
+            if key in self._objects:
+                self._unindex(key, self._objects[key])
+            self._objects[key] = obj
+            self._by_namespace[key[0]].add(key)
+            for label in (obj.metadata.labels or {}).items():
+                self._by_label[label].add(key)
+
+    def delete(self, obj):
+        "removes an object if it is present"
+        key = (obj.metadata.namespace, obj.metadata.name)
+        with self._lock:
+            if key in self._objects:
+                self._unindex(key, self._objects.pop(key))
+
+    def get(self, namespace, name):
+        "returns the object with the given namespace and name, or None"
+        with self._lock:
+            return self._objects.get((namespace, name))
+
+    def list(self, namespace=None, labels=None):
+        "returns the objects in a namespace (all when None) matching every label, sorted by name"
+        with self._lock:
+            if namespace is None:
+                keys = set(self._objects)
+            else:
+                keys = set(self._by_namespace.get(namespace, ()))
+            for label in (labels or {}).items():
+                keys &= self._by_label.get(label, set())
+            return [self._objects[key] for key in sorted(keys, key=lambda key: key[1])]
+
+    def names(self, namespace):
+        "returns the set of object names in a namespace"
+        with self._lock:
+            return {name for _, name in self._by_namespace.get(namespace, ())}
+
+    def _unindex(self, key, obj):
+        self._by_namespace[key[0]].discard(key)
+        if not self._by_namespace[key[0]]:
+            del self._by_namespace[key[0]]
+        for label in (obj.metadata.labels or {}).items():
+            self._by_label[label].discard(key)
+            if not self._by_label[label]:
+                del self._by_label[label]
+
+
+class Informer:
+    "keeps a Store in sync with the cluster through one LIST followed by a WATCH stream"
+
+    def __init__(self, list_func, watch_timeout=WATCH_TIMEOUT):
+        self.list_func = list_func
+        self.watch_timeout = watch_timeout
+        self.store = Store()
+        self.resource_version = None
+        self._synced = threading.Event()
+        self._settled = threading.Event()
+        self._stopped = threading.Event()
+        self._watch = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        "starts the background sync thread once"
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True,
+                                                name=f"informer-{self.list_func.__name__}")
+                self._thread.start()
+        return self
+
+    def stop(self):
+        "stops the background sync thread"
+        self._stopped.set()
+        if self._watch is not None:
+            self._watch.stop()
+
+    def wait_for_sync(self, timeout=DEFAULT_SYNC_TIMEOUT):
+        "starts the informer if needed and waits for the initial LIST; returns False if it timed out or failed"
+        self.start()
+        # The wait ends early when the first LIST fails (e.g. RBAC forbids a
+        # cluster-wide list) so callers can fall back to a direct request.
+        self._settled.wait(timeout)
+        return self._synced.is_set()
+
+    @property
+    def has_synced(self):
+        "whether the store holds a complete LIST"
+        return self._synced.is_set()
+
+    def _run(self):
+        backoff = 1
+        while not self._stopped.is_set():
+            try:
+                if self.resource_version is None:
+                    self._relist()
+                self._watch_events()
+                backoff = 1
+            except ApiException as ex:
+                if ex.status == HTTP_GONE:
+                    # Our resourceVersion has been compacted away; start over.
+                    self.resource_version = None
+                    continue
+                self._settled.set()
+                self._stopped.wait(backoff)
+                backoff = min(backoff * 2, MAX_BACKOFF)
+            except Exception:
+                self._settled.set()
+                self._stopped.wait(backoff)
+                backoff = min(backoff * 2, MAX_BACKOFF)
+
+    def _relist(self):
+        # Paginated so that the api server never has to build one huge
+        # response for the initial LIST.
+        pager = Pager(self.list_func)
+        self.store.replace(list(pager))
+        self.resource_version = pager.resource_version
+        self._synced.set()
+        self._settled.set()
+
+    def _watch_events(self):
+        self._watch = watch.Watch()
+        for event in self._watch.stream(self.list_func,
+                                        resource_version=self.resource_version,
+                                        allow_watch_bookmarks=True,
+                                        timeout_seconds=self.watch_timeout):
+            if self._stopped.is_set():
+                self._watch.stop()
+                break
+
+            if event["type"] == "BOOKMARK":
+                self.resource_version = event["raw_object"]["metadata"]["resourceVersion"]
+                continue
+
+            obj = event["object"]
+            if event["type"] == "DELETED":
+                self.store.delete(obj)
+            else:
+                self.store.upsert(obj)
+            self.resource_version = obj.metadata.resource_version
+
+
+class InformerFactory:
+    "lazily creates and starts the shared informers"
+
+    def __init__(self, api_client):
+        self.core_api = client.CoreV1Api(api_client)
+        self.apps_api = client.AppsV1Api(api_client)
+        self._informers = {}
+        self._lock = threading.Lock()
+
+    @property
+    def pods(self):
+        "the informer for pods in every namespace"
+        return self._informer("pods", self.core_api.list_pod_for_all_namespaces)
+
+    @property
+    def deployments(self):
+        "the informer for deployments in every namespace"
+        return self._informer("deployments", self.apps_api.list_deployment_for_all_namespaces)
+
+    def stop(self):
+        "stops every informer created so far"
+        with self._lock:
+            for informer in self._informers.values():
+                informer.stop()
+
+    def _informer(self, name, list_func):
+        with self._lock:
+            if name not in self._informers:
+                self._informers[name] = Informer(list_func).start()
+            return self._informers[name]
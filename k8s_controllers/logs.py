@@ -0,0 +1,222 @@
+import math
+import threading
+import time
+from collections import deque
+
+from kubernetes.client.rest import ApiException
+
+from k8s_controllers.bulk import parse_label_selector
+from k8s_controllers.pagination import Pager
+from k8s_controllers.streams import close_stream
+
+DEFAULT_TAIL_LINES = 10
+DEFAULT_BUFFER_LINES = 1000
+MAX_LINE_LENGTH = 16384
+
+# Lines from different pods arrive over separate connections; a line is held
+# back this long in case an older one from another pod is still in flight.
+REORDER_WINDOW = 0.5
+DISCOVERY_INTERVAL = 2
+
+LOGGABLE_PHASES = ("Running", "Succeeded", "Failed")
+
+
+def split_timestamp(line):
+    "splits a `timestamps=true` log line into a sortable UTC timestamp and the message"
+    stamp, _, message = line.partition(" ")
+    seconds, _, fraction = stamp.rstrip("Z").partition(".")
+    # RFC 3339 timestamps drop trailing zeros from the fraction, so they only
+    # sort as strings once padded to nanoseconds.
+    return f"{seconds}.{fraction.ljust(9, '0')}", message
+
+
+def selector_for(deployment):
+    "returns the label selector of the pods of a deployment"
+    return ",".join(f"{key}={value}" for key, value in (deployment.spec.selector.match_labels or {}).items())
+
+
+class PodLogStream:
+    "follows the log of one pod container into a bounded buffer"
+
+    def __init__(self, pod_name, container, buffer_lines):
+        self.pod_name = pod_name
+        self.container = container
+        self.lines = deque(maxlen=buffer_lines)
+        self.received = 0
+        self.dropped = 0
+        self.error = None
+        self.active = False
+        self.stopped = False
+        self.response = None
+        self.last_timestamp = None
+        self.last_arrival = None
+
+    def follow(self, core_api, namespace, condition, tail_lines=None):
+        "reads the log until the stream ends, buffering every line under condition"
+        resume_after = self.last_timestamp
+        kwargs = {"tail_lines": tail_lines} if tail_lines is not None else {}
+        if self.last_arrival is not None:
+            # A reopened stream only needs what it may have missed; lines
+            # already buffered are skipped by their timestamp below.
+            kwargs = {"since_seconds": math.ceil(time.monotonic() - self.last_arrival) + 1}
+        try:
+            self.response = core_api.read_namespaced_pod_log(
+                self.pod_name, namespace, container=self.container, follow=True, timestamps=True,
+                _preload_content=False, **kwargs)
+            if self.stopped:
+                close_stream(self.response)
+                return
+            self.error = None
+            for raw in self.response:
+                timestamp, message = split_timestamp(raw.decode("utf-8", "replace").rstrip("\r\n"))
+                if resume_after is not None and timestamp <= resume_after:
+                    continue
+                with condition:
+                    if len(self.lines) == self.lines.maxlen:
+                        self.dropped += 1
+                    self.lines.append((timestamp, time.monotonic(), message[:MAX_LINE_LENGTH]))
+                    self.received += 1
+                    self.last_timestamp = timestamp
+                    self.last_arrival = time.monotonic()
+                    condition.notify()
+        except ApiException as ex:
+            # e.g. 400 while the container is still being created
+            self.error = f"{ex.status} {ex.reason}"
+        except Exception as ex:
+            if self.response is not None:
+                self.error = str(ex)
+        finally:
+            with condition:
+                self.active = False
+                self.response = None
+                condition.notify()
+
+    def stop(self):
+        "closes the stream if it is open"
+        self.stopped = True
+        response = self.response
+        if response is not None:
+            self.response = None
+            close_stream(response)
+
+
+class LogMultiplexer:
+    "follows the logs of every pod matching a label selector and merges them in time order"
+
+    def __init__(self, core_api, namespace, label_selector, informers=None, container=None,
+                 tail_lines=DEFAULT_TAIL_LINES, buffer_lines=DEFAULT_BUFFER_LINES):
+        self.core_api = core_api
+        self.namespace = namespace
+        self.label_selector = label_selector
+        self.informers = informers
+        self.container = container
+        self.tail_lines = tail_lines
+        self.buffer_lines = buffer_lines
+        self._streams = {}
+        self._condition = threading.Condition()
+        self._stopped = threading.Event()
+
+    def pods(self):
+        "returns the pods matching the selector, from the informer when synced"
+        labels = parse_label_selector(self.label_selector)
+        informer = self.informers.pods if self.informers else None
+        if labels is not None and informer is not None and informer.wait_for_sync():
+            return informer.store.list(self.namespace, labels)
+        kwargs = {"label_selector": self.label_selector} if self.label_selector else {}
+        return list(Pager(self.core_api.list_namespaced_pod, namespace=self.namespace, **kwargs))
+
+    def run(self, on_line, duration=None):
+        "passes merged lines to on_line until duration seconds pass or stop() is called, returning a summary"
+        deadline = None if duration is None else time.monotonic() + duration
+        next_discovery = time.monotonic()
+        initial = True
+        try:
+            while not self._stopped.is_set() and (deadline is None or time.monotonic() < deadline):
+                if time.monotonic() >= next_discovery:
+                    self._discover(self.tail_lines if initial else None)
+                    initial = False
+                    next_discovery = time.monotonic() + DISCOVERY_INTERVAL
+                for pod_name, timestamp, message in self._ready_lines():
+                    on_line(pod_name, timestamp, message)
+                with self._condition:
+                    self._condition.wait(REORDER_WINDOW / 5)
+        finally:
+            self.stop()
+        for pod_name, timestamp, message in self._ready_lines(flush=True):
+            on_line(pod_name, timestamp, message)
+        return self.summary()
+
+    def stop(self):
+        "closes every stream"
+        self._stopped.set()
+        with self._condition:
+            streams = list(self._streams.values())
+            self._condition.notify_all()
+        for stream in streams:
+            stream.stop()
+
+    def summary(self):
+        "returns the lines received and dropped and the last error per pod"
+        with self._condition:
+            return [{"Pod": stream.pod_name, "Lines": stream.received, "Dropped": stream.dropped,
+                     "Error": stream.error if not stream.received else None}
+                    for stream in sorted(self._streams.values(), key=lambda stream: stream.pod_name)]
+
+    def _discover(self, tail_lines):
+        try:
+            pods = self.pods()
+        except ApiException:
+            return  # tried again at the next discovery
+        for pod in pods:
+            if pod.status is None or pod.status.phase not in LOGGABLE_PHASES:
+                continue
+            with self._condition:
+                if self._stopped.is_set():
+                    return
+                stream = self._streams.get(pod.metadata.name)
+                if stream is None:
+                    container = self.container or pod.spec.containers[0].name
+                    stream = self._streams[pod.metadata.name] = PodLogStream(pod.metadata.name, container,
+                                                                             self.buffer_lines)
+                elif stream.active or pod.status.phase != "Running":
+                    # Finished pods are read once; running ones are reopened
+                    # when their stream ends (e.g. a container restart).
+                    continue
+                stream.active = True
+            threading.Thread(target=stream.follow, args=(self.core_api, self.namespace, self._condition, tail_lines),
+                             daemon=True, name=f"logs-{pod.metadata.name}").start()
+
+    def _ready_lines(self, flush=False):
+        "pops the buffered lines that can be passed on without breaking time order"
+        ready = []
+        with self._condition:
+            cutoff = time.monotonic() - REORDER_WINDOW
+            streams = list(self._streams.values())
+            while True:
+                heads = [stream for stream in streams if stream.lines]
+                if not heads:
+                    break
+                oldest = min(heads, key=lambda stream: stream.lines[0][0])
+                # Each stream is in order, so the oldest head is final once
+                # every open stream has a line buffered.
+                complete = all(stream.lines for stream in streams if stream.active)
+                if not (flush or complete or oldest.lines[0][1] <= cutoff):
+                    break
+                timestamp, _, message = oldest.lines.popleft()
+                ready.append((oldest.pod_name, timestamp, message))
+        return ready
+
+
+def print_line(pod_name, timestamp, message):
+    "prints one merged log line prefixed with its pod"
+    print(f"[{pod_name}] {message}")
+
+
+def print_summary(summary):
+    "prints how many lines each pod produced and which ones could not be followed"
+    for result in summary:
+        if result["Error"]:
+            print(f"{result['Pod']}: no logs - {result['Error']}")
+        elif result["Dropped"]:
+            print(f"{result['Pod']}: {result['Lines']} lines, {result['Dropped']} dropped because output fell behind")
+    print(f"\n{sum(result['Lines'] for result in summary)} lines from {len(summary)} pod(s).")
@@ -0,0 +1,198 @@
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+from kubernetes.client.rest import ApiException
+
+from k8s_controllers.apply import CLUSTER_SCOPED, RESOURCES, request_json, resource_path, server_side_apply
+from k8s_controllers.pagination import Pager
+
+try:
+    import yaml
+except ImportError:  # YAML manifests are optional; JSON always works
+    yaml = None
+
+MANIFEST_HASH_ANNOTATION = "containermanager.manifest-hash"
+MANIFEST_SUFFIXES = (".yaml", ".yml", ".json")
+
+DEFAULT_WORKERS = 16
+
+
+def load_manifests(directory):
+    "loads every manifest of the YAML/JSON files below a directory, in file order"
+    manifests = []
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for name in sorted(files):
+            if not name.endswith(MANIFEST_SUFFIXES):
+                continue
+            path = os.path.join(root, name)
+            with open(path) as manifest_file:
+                if name.endswith(".json"):
+                    documents = [json.load(manifest_file)]
+                elif yaml is None:
+                    raise RuntimeError(f"PyYAML is required to read {path}")
+                else:
+                    documents = list(yaml.safe_load_all(manifest_file))
+            for document in documents:
+                if not document:
+                    continue
+                # `kubectl get -o yaml` style files wrap their objects in a List.
+                manifests.extend(document["items"] if document.get("kind") == "List" else [document])
+    return [normalise(manifest) for manifest in manifests]
+
+
+def normalise(manifest):
+    "fills in the default namespace and stamps the manifest with a hash of its content"
+    manifest = json.loads(json.dumps(manifest))
+    metadata = manifest.setdefault("metadata", {})
+    if manifest["kind"] not in CLUSTER_SCOPED:
+        metadata.setdefault("namespace", "default")
+    (metadata.get("annotations") or {}).pop(MANIFEST_HASH_ANNOTATION, None)
+    digest = hashlib.sha256(json.dumps(manifest, sort_keys=True).encode()).hexdigest()
+    # Fields dropped from a manifest do not show up in a subset comparison,
+    # but they do change this hash.
+    metadata["annotations"] = dict(metadata.get("annotations") or {}, **{MANIFEST_HASH_ANNOTATION: digest})
+    return manifest
+
+
+def object_key(obj):
+    "identifies an object by api version, kind, namespace and name"
+    metadata = obj["metadata"]
+    return obj["apiVersion"], obj["kind"], metadata.get("namespace"), metadata["name"]
+
+
+def is_subset(desired, live):
+    "whether every field set in desired has the same value in live"
+    if isinstance(desired, dict):
+        return isinstance(live, dict) and all(key in live and is_subset(value, live[key])
+                                              for key, value in desired.items())
+    if isinstance(desired, list):
+        return (isinstance(live, list) and len(desired) == len(live)
+                and all(is_subset(want, have) for want, have in zip(desired, live)))
+    return desired == live
+
+
+def raw_list(api_client, path):
+    "a list function over a REST collection that returns plain dicts, for use with Pager"
+    def list_func(limit=None, _continue=None):
+        query = [("limit", limit)] if limit else []
+        if _continue:
+            query.append(("continue", _continue))
+        body = request_json(api_client, "GET", path, query)
+        metadata = body.get("metadata", {})
+        return SimpleNamespace(items=body.get("items", []),
+                               metadata=SimpleNamespace(resource_version=metadata.get("resourceVersion"),
+                                                        _continue=metadata.get("continue")))
+    return list_func
+
+
+class ManifestApplier:
+    "applies many manifests, sending requests only for objects that differ from the cluster"
+
+    def __init__(self, api_client, max_workers=DEFAULT_WORKERS):
+        self.api_client = api_client
+        self.max_workers = max_workers
+
+    def live_objects(self, manifests):
+        "fetches the live objects for the manifests with one paginated LIST per kind and namespace"
+        collections = sorted({(api_version, kind, namespace)
+                              for api_version, kind, namespace, _ in map(object_key, manifests)
+                              if kind in RESOURCES}, key=str)
+
+        def fetch(collection):
+            api_version, kind, namespace = collection
+            path = resource_path(api_version, kind, namespace)
+            try:
+                return [dict(item, apiVersion=api_version, kind=kind)
+                        for item in Pager(raw_list(self.api_client, path))]
+            except ApiException as ex:
+                if ex.status == 404:
+                    return []  # the namespace does not exist yet
+                raise
+
+        live = {}
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(collections)))) as pool:
+            for items in pool.map(fetch, collections):
+                live.update((object_key(item), item) for item in items)
+        return live
+
+    def plan(self, manifests):
+        "returns (manifest, action) pairs, where action is create, update, unchanged or skipped"
+        live = self.live_objects(manifests)
+        plan = []
+        for manifest in manifests:
+            current = live.get(object_key(manifest))
+            if manifest["kind"] not in RESOURCES:
+                plan.append((manifest, "skipped"))
+            elif current is None:
+                plan.append((manifest, "create"))
+            elif self._unchanged(manifest, current):
+                plan.append((manifest, "unchanged"))
+            else:
+                plan.append((manifest, "update"))
+        return plan
+
+    @staticmethod
+    def _unchanged(manifest, live):
+        # The server rewrites some values (cpu: 1 reads back as "1", 0.5 as
+        # "500m"), so the manifest is compared by the hash stamped on it at
+        # its last apply; objects applied by other tools carry no hash.
+        live_hash = ((live.get("metadata") or {}).get("annotations") or {}).get(MANIFEST_HASH_ANNOTATION)
+        if live_hash is not None:
+            return live_hash == manifest["metadata"]["annotations"][MANIFEST_HASH_ANNOTATION]
+        return is_subset(manifest, live)
+
+    def apply(self, manifests, dry_run=False):
+        "applies the manifests that changed concurrently, returning a result per manifest"
+        plan = self.plan(manifests)
+        changed = [(manifest, action) for manifest, action in plan if action in ("create", "update")]
+        results = [self._result(manifest, action, 0.0, None) for manifest, action in plan if action == "unchanged"]
+        # Kinds without a known REST path fail on their own instead of
+        # aborting the whole apply.
+        results.extend(self._result(manifest, action, 0.0, f"unsupported kind '{manifest['kind']}'")
+                       for manifest, action in plan if action == "skipped")
+        if changed:
+            with ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(changed)))) as pool:
+                results.extend(pool.map(lambda item: self._apply(*item, dry_run=dry_run), changed))
+        return results
+
+    def _apply(self, manifest, action, dry_run=False):
+        started = time.monotonic()
+        try:
+            server_side_apply(self.api_client, manifest, dry_run=dry_run)
+            error = None
+        except ApiException as ex:
+            error = f"{ex.status} {ex.reason}"
+        return self._result(manifest, action, time.monotonic() - started, error)
+
+    @staticmethod
+    def _result(manifest, action, seconds, error):
+        _, kind, namespace, name = object_key(manifest)
+        return {
+            "Kind": kind,
+            "Namespace": namespace,
+            "Name": name,
+            "Action": action,
+            "Success": error is None,
+            "Seconds": seconds,
+            "Error": error,
+        }
+
+
+def print_results(results, elapsed):
+    "prints the changed objects and a summary of a manifest apply"
+    for result in results:
+        if result["Action"] == "unchanged":
+            continue
+        status = "ok" if result["Success"] else f"failed: {result['Error']}"
+        location = f"{result['Namespace']}/" if result["Namespace"] else ""
+        print(f"{result['Action']:<9} {result['Kind']} {location}{result['Name']}: {status}")
+    counts = {action: sum(result["Action"] == action for result in results)
+              for action in ("create", "update", "unchanged")}
+    failed = sum(not result["Success"] for result in results)
+    print(f"\n{counts['create']} created, {counts['update']} updated, {counts['unchanged']} unchanged, "
+          f"{failed} failed in {elapsed:.2f}s.")
@@ -0,0 +1,40 @@
+import threading
+import time
+
+from k8s_controllers.apply import request_json
+
+# Ask the api server for metadata only; it falls back to full objects if it
+# does not support partial metadata responses.
+PARTIAL_METADATA_LIST = "application/json;as=PartialObjectMetadataList;g=meta.k8s.io;v=v1,application/json"
+
+DEFAULT_TTL = 30
+
+
+class NamespaceProvider:
+    "provides namespace names from the namespace list endpoint with a short-lived cache"
+
+    def __init__(self, api_client, ttl=DEFAULT_TTL):
+        self.api_client = api_client
+        self.ttl = ttl
+        self._names = None
+        self._fetched_at = 0.0
+        self._lock = threading.Lock()
+
+    def names(self, refresh=False):
+        "returns the sorted namespace names, hitting the api server at most once per ttl"
+        with self._lock:
+            expired = time.monotonic() - self._fetched_at >= self.ttl
+            if refresh or self._names is None or expired:
+                self._names = self._fetch()
+                self._fetched_at = time.monotonic()
+            return list(self._names)
+
+    def invalidate(self):
+        "forgets the cached names so the next call fetches them again"
+        with self._lock:
+            self._names = None
+
+    def _fetch(self):
+        body = request_json(self.api_client, "GET", "/api/v1/namespaces",
+                            header_params={"Accept": PARTIAL_METADATA_LIST})
+        return sorted(item["metadata"]["name"] for item in body.get("items", []))
@@ -0,0 +1,33 @@
+DEFAULT_PAGE_SIZE = 500
+
+
+class Pager:
+    "iterates over a kubernetes LIST call one page at a time using limit/continue tokens"
+
+    def __init__(self, list_func, page_size=DEFAULT_PAGE_SIZE, **kwargs):
+        self.list_func = list_func
+        self.page_size = page_size
+        self.kwargs = kwargs
+        self.resource_version = None
+
+    def pages(self):
+        "yields the items of each page as it arrives"
+        token = None
+        while True:
+            kwargs = dict(self.kwargs, limit=self.page_size)
+            if token:
+                kwargs["_continue"] = token
+            result = self.list_func(**kwargs)
+            # Every page of a paginated LIST is served from the same snapshot,
+            # so the first page's resourceVersion is valid for the whole list.
+            if self.resource_version is None:
+                self.resource_version = result.metadata.resource_version
+            yield result.items
+
+            token = result.metadata._continue
+            if not token:
+                break
+
+    def __iter__(self):
+        for page in self.pages():
+            yield from page
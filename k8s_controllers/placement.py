@@ -0,0 +1,119 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from kubernetes.client.rest import ApiException
+
+HTTP_CONFLICT = 409
+
+DEFAULT_WORKERS = 16
+MAX_NAME_RETRIES = 5
+MAX_NAME_SUFFIX = 9999
+RANDOM_NAME_ATTEMPTS = 100
+
+MASTER_NODE_LABELS = ("node-role.kubernetes.io/master", "node-role.kubernetes.io/control-plane")
+
+
+def worker_node_names(core_api):
+    "returns the names of every node that is not a master/control-plane node"
+    nodes = core_api.list_node().items
+    return [node.metadata.name for node in nodes
+            if not any(label in (node.metadata.labels or {}) for label in MASTER_NODE_LABELS)]
+
+
+class PodNameAllocator:
+    "hands out '<prefix><random number>' pod names that are not taken yet"
+
+    def __init__(self, prefix, taken):
+        self.prefix = prefix
+        self.taken = set(taken)
+        self._lock = threading.Lock()
+
+    def allocate(self):
+        "returns a name that is neither an existing pod nor handed out before"
+        with self._lock:
+            for _ in range(RANDOM_NAME_ATTEMPTS):
+                name = f"{self.prefix}{random.randint(1, MAX_NAME_SUFFIX)}"
+                if name not in self.taken:
+                    break
+            else:
+                # Most names are taken; choose among the ones that are left.
+                free = [f"{self.prefix}{suffix}" for suffix in range(1, MAX_NAME_SUFFIX + 1)
+                        if f"{self.prefix}{suffix}" not in self.taken]
+                if not free:
+                    raise ValueError(f"every name from {self.prefix}1 to {self.prefix}{MAX_NAME_SUFFIX} is taken")
+                name = random.choice(free)
+            self.taken.add(name)
+            return name
+
+
+class PodPlacer:
+    "creates one pod per node concurrently with bounded parallelism"
+
+    def __init__(self, core_api, max_workers=DEFAULT_WORKERS):
+        self.core_api = core_api
+        self.max_workers = max_workers
+
+    def place(self, image_with_tag, pod_name, namespace, node_names, existing_names=()):
+        "creates a pod pinned to each node, returning a result per node"
+        allocator = PodNameAllocator(pod_name, existing_names)
+        # Names are reserved up front; create conflicts (someone else took the
+        # name since we looked) are retried with a fresh name.
+        names = [allocator.allocate() for _ in node_names]
+
+        if not node_names:
+            return []
+        workers = max(1, min(self.max_workers, len(node_names)))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(lambda args: self._create(image_with_tag, namespace, allocator, *args),
+                                 zip(node_names, names)))
+
+    def _create(self, image_with_tag, namespace, allocator, node_name, pod_name):
+        started = time.monotonic()
+        error = None
+        for attempt in range(MAX_NAME_RETRIES):
+            try:
+                self.core_api.create_namespaced_pod(namespace=namespace,
+                                                    body=pod_manifest(pod_name, image_with_tag, node_name))
+                error = None
+                break
+            except ApiException as ex:
+                error = f"{ex.status} {ex.reason}"
+                if ex.status != HTTP_CONFLICT or attempt + 1 == MAX_NAME_RETRIES:
+                    break
+            # Only switch names when the new one is going to be tried, so the
+            # result names the pod that was actually attempted.
+            try:
+                pod_name = allocator.allocate()
+            except ValueError as ex:
+                error = str(ex)
+                break
+
+        return {
+            "Node": node_name,
+            "Pod": pod_name,
+            "Success": error is None,
+            "Seconds": time.monotonic() - started,
+            "Error": error,
+        }
+
+
+def pod_manifest(pod_name, image_with_tag, node_name):
+    "builds the manifest of a pod pinned to a node"
+    image = image_with_tag.split(":")[0]
+    return {
+        "apiVersion": "v1",
+        "kind": "Pod",
+        "metadata": {"name": pod_name},
+        "spec": {
+            "containers": [
+                {
+                    "name": f"{image}-container",
+                    "image": image_with_tag,
+                }
+            ],
+            # Deploy the pod on a specific node
+            "nodeSelector": {"kubernetes.io/hostname": node_name},
+        }
+    }
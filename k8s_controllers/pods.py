@@ -1,17 +1,23 @@
-import random
-
-from kubernetes import client, config
-from kubernetes.stream import stream
+import sys
+import time
 
 from kubernetes.client.rest import ApiException
-import pandas as pd
+
+from k8s_controllers.clients import get_registry
+from k8s_controllers.exec_sessions import ExecSessionManager
+from k8s_controllers.pagination import Pager
+from k8s_controllers.placement import PodPlacer, worker_node_names
 
 class PodsActions:
     "implements methods for interacting with kubernetes Pods"
     
     def __init__(self):
-        self.core_api = client.CoreV1Api()
-        self.app_api = client.AppsV1Api()
+        registry = get_registry()
+        self.core_api = registry.core_api
+        self.app_api = registry.apps_api
+        self.namespaces = registry.namespaces
+        self.informers = registry.informers
+        self.exec_sessions = ExecSessionManager(registry.stream_api)
         
         
     def list_pods(self):
@@ -20,11 +26,12 @@ class PodsActions:
         try:
             namespace_names = self.list_namespaces()
             selected_namespace = self.get_selected_namespace(namespace_names)
-            pod_names = self.get_pods_in_namespace(selected_namespace)
     
             print(f"\nAvailable Pods in the {selected_namespace} Namespace:")
-            for i, pod in enumerate(pod_names, start=1):
-                print(f"{i}. {pod}")
+            pod_names = []
+            for i, pod in enumerate(self.iter_pods(selected_namespace), start=1):
+                print(f"{i}. {pod.metadata.name}")
+                pod_names.append(pod.metadata.name)
     
             return pod_names, selected_namespace
     
@@ -35,8 +42,7 @@ class PodsActions:
     def list_namespaces(self):
         "lists all the namespaces at the kubernetes cluster"
     
-        pods = self.core_api.list_pod_for_all_namespaces(watch=False)
-        namespace_names = list(sorted(set([pod.metadata.namespace for pod in pods.items])))
+        namespace_names = self.namespaces.names()
         
         # Ask the user to choose a namespace 
         print("\nChoose from Available Namespaces:")
@@ -59,12 +65,18 @@ class PodsActions:
     def get_pods_in_namespace(self, selected_namespace):
         "Fetches the pods within a namespace"
         try:
-            pods = self.core_api.list_namespaced_pod(namespace=selected_namespace, watch=False)
-            return [pod.metadata.name for pod in pods.items]
+            return [pod.metadata.name for pod in self.iter_pods(selected_namespace)]
         except ApiException as ex:
             print(f"Error listing pods: {ex}")
             return []
 
+    def iter_pods(self, selected_namespace):
+        "Yields the pods within a namespace, from the informer when synced or page by page otherwise"
+        informer = self.informers.pods
+        if informer.wait_for_sync():
+            return iter(informer.store.list(selected_namespace))
+        return iter(Pager(self.core_api.list_namespaced_pod, namespace=selected_namespace))
+
     def describe_pod(self):
         "Describes a pod attributes."
         try:
@@ -137,49 +149,26 @@ class PodsActions:
                 return
             
             while True: 
-                exec_command = ['/bin/sh']
-                resp = stream(self.core_api.connect_get_namespaced_pod_exec,
-                              name=selected_podname,
-                              namespace=selected_namespace,
-                              command=exec_command,
-                              container=container_name,
-                              stdin=True,
-                              stdout=True,
-                              stderr=True,
-                              tty=False,
-                              _preload_content=False)
-        
                 command = input("\nEnter the command to run (or 'exit' to quit): ").strip()
                 
                 if command.lower() == 'exit':
                     return None
-        
-                count = 0
-                count2 = 2
-                responseCommandFull=""
-                resp.write_stdin(command)
-                
-                while resp.is_open():
-                    print("WHILEEEE ::: %s"%resp.is_open())
-                    resp.update(timeout=1)
-                    if resp.peek_stdout():
-                        count = count+1
-                        responseCom = resp.read_stdout()
-                        print("STDIN :: %s"%responseCom)
-                        #if len(responseCom)!= 1:
-                        responseCommandFull="%s\n%s"%(responseCommandFull,responseCom)
-                    if resp.peek_stderr():
-                        count = count+1
-                        responseCom = resp.read_stderr()
-                        print("STDERR :: %s"%responseCom)
-                        responseCommandFull="%s\n%s"%(responseCommandFull,responseCom)
-                    else:
-                        if count2 == count:
-                                print("Executing command sucessfully.")
-                                break
-                        count2 = count
-                resp.close()
-                print(responseCommandFull)
+                if not command:
+                    continue
+
+                # The shell stays open between commands; output is printed as
+                # it arrives rather than collected first.
+                session = self.exec_sessions.session(selected_podname, selected_namespace, container_name)
+                result = session.run(command,
+                                     on_stdout=lambda text: print(text, end="", flush=True),
+                                     on_stderr=lambda text: print(text, end="", file=sys.stderr, flush=True))
+
+                if result["timed_out"]:
+                    print("\nCommand timed out; the shell session was closed.")
+                elif result["exit_code"] is None:
+                    print("\nThe shell session ended.")
+                elif result["exit_code"] != 0:
+                    print(f"\nCommand exited with code {result['exit_code']}.")
                 
         except ApiException as e:
             print(f"Error executing command: {e}")
@@ -228,60 +217,33 @@ class PodsActions:
             else:
                 selected_namespace = "default"
     
-            # Get the list of nodes
-            nodes = self.core_api.list_node().items
-    
-            for node in nodes:
-                # Skip master nodes
-                if "node-role.kubernetes.io/master" in node.metadata.labels:
-                    continue
-    
-                node_name = node.metadata.name
-    
-                # Check if the modified pod name already exists
-                while True:
-                    random_number = random.randint(1, 9999)
-                    modified_pod_name = f"{user_pod_name}{random_number}"
-    
-                    # Query existing pods to check for name collision
-                    existing_pods = self.core_api.list_namespaced_pod(namespace=selected_namespace).items
-                    existing_pod_names = [pod.metadata.name for pod in existing_pods]
-    
-                    if modified_pod_name not in existing_pod_names:
-                        break  # The modified pod name is unique, exit the loop
-    
-                # Specify the pod definition
-                pod_manifest = {
-                    "apiVersion": "v1",
-                    "kind": "Pod",
-                    "metadata": {"name": modified_pod_name},
-                    "spec": {
-                        "containers": [
-                            {
-                                "name": f"{user_image}-container",
-                                "image": user_image_with_tag,
-                                # Add more container settings as needed
-                            }
-                        ]
-                    }
-                }
-    
-                # Add node selector to the pod manifest to deploy it on a specific node
-                pod_manifest['spec']['nodeSelector'] = {'kubernetes.io/hostname': node_name}
-    
-                # Create the pod
-                self.core_api.create_namespaced_pod(namespace=selected_namespace, body=pod_manifest)
-    
-                print(f"Pod '{modified_pod_name}' created successfully on node '{node_name}' in '{selected_namespace}' namespace")
+            started = time.monotonic()
+            results = self.place_pods(user_image_with_tag, user_pod_name, selected_namespace)
+
+            for result in sorted(results, key=lambda result: result["Node"]):
+                if result["Success"]:
+                    print(f"Pod '{result['Pod']}' created successfully on node '{result['Node']}' "
+                          f"in '{selected_namespace}' namespace ({result['Seconds']:.2f}s)")
+                else:
+                    print(f"Error creating pod '{result['Pod']}' on node '{result['Node']}': {result['Error']}")
+            print(f"Placed {sum(result['Success'] for result in results)}/{len(results)} pods "
+                  f"in {time.monotonic() - started:.2f}s")
 
         except Exception as ex:
             print(f"Error creating pod: {ex}")
     
+    def place_pods(self, image_with_tag, pod_name, namespace):
+        "creates a pod on every worker node concurrently and returns a result per node"
+        node_names = worker_node_names(self.core_api)
+        # One lookup of the existing names (from the informer when synced)
+        # instead of a LIST per node and per retry.
+        existing_names = set(self.get_pods_in_namespace(namespace))
+        return PodPlacer(self.core_api).place(image_with_tag, pod_name, namespace, node_names, existing_names)
+
 
 def manage_pods():
     "provides an interactive menu for managing pods"
     
-    config.load_kube_config()
     action = PodsActions()
     while True:
         print("\nSelect an 'Interact with Pods' Action")
@@ -301,6 +263,7 @@ def manage_pods():
         elif choice == "4":
            action.create_pods()
         elif choice == "5":
+            action.exec_sessions.close_all()
             break
         else:
             print("Invalid choice. Please select a valid option.")
@@ -0,0 +1,186 @@
+import functools
+import queue
+import threading
+import time
+
+from kubernetes import watch
+from kubernetes.client.rest import ApiException
+
+from k8s_controllers.streams import close_stream
+
+REVISION_ANNOTATION = "deployment.kubernetes.io/revision"
+POD_TEMPLATE_HASH = "pod-template-hash"
+
+DEFAULT_TIMEOUT = 900
+WATCH_RETRY_DELAY = 1
+
+
+def rollout_state(deployment):
+    "summarises the rollout status of a deployment object"
+    spec, status = deployment.spec, deployment.status
+    desired = spec.replicas if spec.replicas is not None else 1
+    conditions = {condition.type: condition for condition in (status.conditions or [])}
+    progressing = conditions.get("Progressing")
+    return {
+        "Desired": desired,
+        "Updated": status.updated_replicas or 0,
+        "Ready": status.ready_replicas or 0,
+        "Available": status.available_replicas or 0,
+        "Total": status.replicas or 0,
+        "Observed": (status.observed_generation or 0) >= (deployment.metadata.generation or 0),
+        "Stalled": progressing is not None and progressing.reason == "ProgressDeadlineExceeded",
+    }
+
+
+def rollout_complete(state):
+    "whether every replica runs the new template and is available (as in `kubectl rollout status`)"
+    return (state["Observed"] and state["Updated"] == state["Desired"]
+            and state["Total"] == state["Updated"] and state["Available"] == state["Updated"])
+
+
+def revision(obj):
+    "returns the rollout revision recorded on a deployment or replica set"
+    return int((obj.metadata.annotations or {}).get(REVISION_ANNOTATION, 0))
+
+
+class RolloutMonitor:
+    "follows a deployment rollout through watches on the deployment and its replica sets"
+
+    def __init__(self, apps_api, timeout=DEFAULT_TIMEOUT):
+        self.apps_api = apps_api
+        self.timeout = timeout
+
+    def follow(self, name, namespace, on_progress=None, rollback=False):
+        "blocks until the rollout completes, stalls or times out, returning the outcome"
+        started = time.monotonic()
+        deadline = started + self.timeout
+        events = queue.Queue()
+        stopped = threading.Event()
+        responses = {}
+
+        deployment = self.apps_api.read_namespaced_deployment(name, namespace)
+        selector = ",".join(f"{key}={value}" for key, value in (deployment.spec.selector.match_labels or {}).items())
+        self._watch(stopped, responses, events, deadline, "Deployment", self.apps_api.list_namespaced_deployment,
+                    namespace, field_selector=f"metadata.name={name}")
+        self._watch(stopped, responses, events, deadline, "ReplicaSet", self.apps_api.list_namespaced_replica_set,
+                    namespace, label_selector=selector)
+
+        replica_sets = {}
+        last = None
+        outcome = {"Status": "timeout", "Error": f"rollout not finished after {self.timeout}s"}
+        try:
+            while time.monotonic() < deadline:
+                try:
+                    kind, obj = events.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if kind == "Error":
+                    outcome = {"Status": "failed", "Error": str(obj)}
+                    break
+                if kind == "ReplicaSet":
+                    if self._owned_by(obj, deployment):
+                        replica_sets[obj.metadata.name] = obj
+                else:
+                    deployment = obj
+
+                state = rollout_state(deployment)
+                report = dict(state, ReplicaSets=self._replica_set_counts(replica_sets, deployment))
+                report.pop("Stalled")
+                if on_progress and report != last:
+                    on_progress(report, time.monotonic() - started)
+                last = report
+                if rollout_complete(state):
+                    outcome = {"Status": "complete", "Error": None}
+                    break
+                if state["Stalled"]:
+                    outcome = {"Status": "stalled", "Error": "ProgressDeadlineExceeded"}
+                    break
+        finally:
+            # Closing the responses ends the watches now rather than at
+            # their next event.
+            stopped.set()
+            for response in list(responses.values()):
+                close_stream(response)
+
+        outcome.update(Seconds=time.monotonic() - started, Revision=revision(deployment), RolledBack=None)
+        if outcome["Status"] == "stalled" and rollback:
+            outcome["RolledBack"] = self.rollback(deployment, replica_sets.values())
+        return outcome
+
+    def rollback(self, deployment, replica_sets):
+        "restores the pod template of the previous revision, returning that revision (or None)"
+        current = revision(deployment)
+        previous = [rs for rs in replica_sets if revision(rs) < current and self._owned_by(rs, deployment)]
+        if not previous:
+            return None
+        target = max(previous, key=revision)
+        template = self.apps_api.api_client.sanitize_for_serialization(target.spec.template)
+        # The hash label is added by the controller to the replica set's copy
+        # of the template, not part of what the user deployed.
+        template.get("metadata", {}).get("labels", {}).pop(POD_TEMPLATE_HASH, None)
+        self.apps_api.patch_namespaced_deployment(
+            deployment.metadata.name, deployment.metadata.namespace,
+            [{"op": "replace", "path": "/spec/template", "value": template}])
+        return revision(target)
+
+    def _watch(self, stopped, responses, events, deadline, kind, list_func, namespace, **kwargs):
+        @functools.wraps(list_func)
+        def opened(*args, **params):
+            response = responses[kind] = list_func(*args, **params)
+            if stopped.is_set():
+                close_stream(response)
+            return response
+
+        def run():
+            watcher = watch.Watch()
+            resource_version = None
+            try:
+                while not stopped.is_set() and time.monotonic() < deadline:
+                    # The first events of a new watch describe the current
+                    # state, so nothing is missed between reading the
+                    # deployment and watching. A watch the api server ends
+                    # early is resumed from the last version seen.
+                    resume = {"resource_version": resource_version} if resource_version else {}
+                    try:
+                        for event in watcher.stream(opened, namespace, **kwargs, **resume,
+                                                    timeout_seconds=max(1, int(deadline - time.monotonic()))):
+                            if event["type"] in ("ADDED", "MODIFIED"):
+                                events.put((kind, event["object"]))
+                    except ApiException as ex:
+                        if ex.status != 410 or resource_version is None:
+                            raise
+                        watcher.resource_version = None  # expired; start over from the current state
+                    resource_version = watcher.resource_version
+                    stopped.wait(WATCH_RETRY_DELAY)
+            except ApiException as ex:
+                if not stopped.is_set():
+                    events.put(("Error", f"{ex.status} {ex.reason}"))
+            except Exception as ex:
+                # e.g. a dropped connection; also how a closed watch ends
+                if not stopped.is_set():
+                    events.put(("Error", f"{type(ex).__name__}: {ex}"))
+
+        threading.Thread(target=run, daemon=True, name=f"rollout-{kind.lower()}").start()
+
+    @staticmethod
+    def _owned_by(replica_set, deployment):
+        return any(owner.uid == deployment.metadata.uid for owner in (replica_set.metadata.owner_references or []))
+
+    @staticmethod
+    def _replica_set_counts(replica_sets, deployment):
+        current = revision(deployment)
+        counts = []
+        for rs in sorted(replica_sets.values(), key=revision, reverse=True):
+            if not rs.status.replicas and revision(rs) != current:
+                continue  # scaled-down old revisions
+            counts.append({"Name": rs.metadata.name, "Revision": revision(rs), "Replicas": rs.status.replicas or 0,
+                           "Ready": rs.status.ready_replicas or 0})
+        return counts
+
+
+def print_progress(report, elapsed):
+    "prints one line of rollout progress"
+    replica_sets = ", ".join(f"{rs['Name']} (rev {rs['Revision']}) {rs['Ready']}/{rs['Replicas']} ready"
+                             for rs in report["ReplicaSets"])
+    print(f"[{elapsed:6.1f}s] updated {report['Updated']}/{report['Desired']}, ready {report['Ready']}, "
+          f"available {report['Available']}" + (f" | {replica_sets}" if replica_sets else ""))
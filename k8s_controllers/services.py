@@ -1,91 +1,127 @@
-from kubernetes import client, config
+import time
 
+from k8s_controllers.applier import GraphApplier, print_event
+from k8s_controllers.apply import server_side_apply
+from k8s_controllers.clients import get_registry
+from k8s_controllers.manifests import ManifestApplier, load_manifests, print_results as print_manifest_results
 
-class ServicesActions:
-    def __init__(self):
-        self.core_api = client.CoreV1Api()
-        self.app_api = client.AppsV1Api()
 
-    def create_deployment(self, name, image, replicas, env_vars):
-        "creates a deployment"
-        
-        deployment_manifest = {
-                "apiVersion": "apps/v1",
-                "kind": "Deployment",
-                "metadata": {"name": name},
+def deployment_manifest(name, image, replicas, env_vars, namespace="default"):
+    "builds the manifest of a single-container deployment"
+    return {
+        "apiVersion": "apps/v1",
+        "kind": "Deployment",
+        "metadata": {"name": name, "namespace": namespace},
+        "spec": {
+            "replicas": replicas,
+            "selector": {"matchLabels": {"app": name}},
+            "template": {
+                "metadata": {"labels": {"app": name}},
                 "spec": {
-                    "replicas": replicas,
-                    "selector": {"matchLabels": {"app": name}},
-                    "template": {
-                        "metadata": {"labels": {"app": name}},
-                        "spec": {
-                            "containers": [{
-                                "name": name,
-                                "image": image,
-                                "env": [{"name": key, "value": value} for key, value in env_vars.items()],
-                            }]
-                        }
-                    }
+                    "containers": [{
+                        "name": name,
+                        "image": image,
+                        "env": [{"name": key, "value": value} for key, value in env_vars.items()],
+                    }]
                 }
             }
-        self.app_api.create_namespaced_deployment(namespace="default", body=deployment_manifest)
+        }
+    }
 
-    def create_service(self, name, selector, service_type, ports):
-        "creates a service"
-        
-        service_manifest = {
-            "apiVersion": "v1",
-            "kind": "Service",
-            "metadata": {"name": name},
-            "spec": {
-                "selector": selector,
-                "ports": [{"protocol": "TCP", "port": port} for port in ports],
-                "type": service_type
-            }
+
+def service_manifest(name, selector, service_type, ports, namespace="default"):
+    "builds the manifest of a TCP service"
+    return {
+        "apiVersion": "v1",
+        "kind": "Service",
+        "metadata": {"name": name, "namespace": namespace},
+        "spec": {
+            "selector": selector,
+            "ports": [{"protocol": "TCP", "port": port} for port in ports],
+            "type": service_type
         }
+    }
 
-        self.core_api.create_namespaced_service(namespace="default", body=service_manifest)
+
+class ServicesActions:
+    def __init__(self):
+        registry = get_registry()
+        self.api_client = registry.api_client
+        self.core_api = registry.core_api
+        self.app_api = registry.apps_api
+
+    def create_deployment(self, name, image, replicas, env_vars):
+        "creates or updates a deployment"
+        # Server-side apply makes reruns update the object instead of failing with 409.
+        server_side_apply(self.api_client, deployment_manifest(name, image, replicas, env_vars))
+
+    def create_service(self, name, selector, service_type, ports):
+        "creates or updates a service"
+        server_side_apply(self.api_client, service_manifest(name, selector, service_type, ports))
+
+    def wordpress_stack(self):
+        "the WordPress and MySQL resources, with web started only once mysql is ready"
+        applier = GraphApplier(self.api_client)
+        applier.add("deployment/mysql", deployment_manifest("mysql", "mysql:5", replicas=2,
+                                                            env_vars={"MYSQL_ROOT_PASSWORD": "root"}))
+        applier.add("service/mysql", service_manifest("mysql", selector={"app": "mysql"},
+                                                      service_type="ClusterIP", ports=[3306]))
+        applier.add("deployment/web", deployment_manifest("web", "vulhub/wordpress:4.6", replicas=2, env_vars={
+            "WORDPRESS_DB_HOST": "mysql:3306",
+            "WORDPRESS_DB_USER": "root",
+            "WORDPRESS_DB_PASSWORD": "root",
+            "WORDPRESS_DB_NAME": "wordpress"
+        }), needs=["deployment/mysql", "service/mysql"])
+        # WordPress Service with LoadBalancer; it is ready once web pods back it.
+        applier.add("service/web", service_manifest("web", selector={"app": "web"},
+                                                    service_type="LoadBalancer", ports=[80]))
+        return applier
 
     def orchestrate_services(self):
         "Orchestrates Deployment and Services for WordPress and MySQL"
         try:
+            report = self.wordpress_stack().apply(on_event=print_event)
+            failed = [key for key, result in report["resources"].items() if result["Error"]]
+            if failed:
+                print(f"Error: {', '.join(sorted(failed))} did not become ready.")
+            else:
+                print(f"WordPress and MySQL Services deployed successfully, serving after {report['seconds']:.2f}s.")
     
-            # Create MySQL Deployment
-            self.create_deployment("mysql", "mysql:5", replicas=2, env_vars={"MYSQL_ROOT_PASSWORD": "root"})
-    
-            # Create WordPress Deployment
-            self.create_deployment("web", "vulhub/wordpress:4.6", replicas=2, env_vars={
-                "WORDPRESS_DB_HOST": "mysql:3306",
-                "WORDPRESS_DB_USER": "root",
-                "WORDPRESS_DB_PASSWORD": "root",
-                "WORDPRESS_DB_NAME": "wordpress"
-            })
-    
-            # Create MySQL Service
-            self.create_service("mysql", selector={"app": "mysql"}, service_type="ClusterIP", ports=[3306])
-    
-            # Create WordPress Service with LoadBalancer
-            self.create_service("web", selector={"app": "web"}, service_type="LoadBalancer", ports=[80])
-    
-            print("WordPress and MySQL Services deployed successfully.")
-    
+        except Exception as e:
+            print(f"Error: {e}")
+
+    def apply_manifest_directory(self):
+        "Applies every manifest in a directory, skipping objects that already match the cluster"
+        directory = input("\nEnter the manifest directory or type 'exit' to leave: ").strip()
+        if directory.lower() == "exit":
+            return
+        dry_run = input("Dry run only? (y/N): ").strip().lower() == "y"
+
+        try:
+            manifests = load_manifests(directory)
+            print(f"Loaded {len(manifests)} manifest(s) from {directory}.")
+            started = time.monotonic()
+            results = ManifestApplier(self.api_client).apply(manifests, dry_run=dry_run)
+            print_manifest_results(results, time.monotonic() - started)
         except Exception as e:
             print(f"Error: {e}")
             
 def manage_services():
     "provides an interactive menu for managing services"
     
-    config.load_kube_config()
     action = ServicesActions()
     while True:
         print("\nSelect an 'Interact with Pods' Action")
         print("1. Run WordPress Microservice")
-        print("2. Back to 'Docker Actions' Menu")
+        print("2. Apply Manifest Directory")
+        print("3. Back to 'Docker Actions' Menu")
         
         choice = input("\nEnter your choice: ")
         if choice == "1":
             action.orchestrate_services()
         elif choice == "2":
+            action.apply_manifest_directory()
+        elif choice == "3":
             break
         else:
             print("Invalid choice. Please select a valid option.")
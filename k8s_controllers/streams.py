@@ -0,0 +1,13 @@
+import socket
+
+
+def close_stream(response):
+    "closes a streaming response (a followed log or a watch), unblocking the thread reading it"
+    connection = getattr(response, "connection", None)
+    sock = getattr(connection, "sock", None)
+    if sock is not None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+    response.close()
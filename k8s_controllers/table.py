@@ -0,0 +1,32 @@
+import sys
+
+
+class TableFormatter:
+    "prints rows in fixed-width columns as soon as they are available"
+
+    def __init__(self, columns, widths=None, out=None):
+        self.columns = columns
+        widths = widths or {}
+        self.widths = {column: max(len(column), widths.get(column, 12)) for column in columns}
+        self.out = out or sys.stdout
+        self.rows = 0
+
+    def header(self):
+        "prints the column names and a separator line"
+        self._write(list(self.columns))
+        self._write(["-" * self.widths[column] for column in self.columns])
+
+    def row(self, row):
+        "prints one row given as a dict keyed by column"
+        self._write([row.get(column, "") for column in self.columns])
+        self.rows += 1
+
+    def _write(self, values):
+        cells = []
+        for column, value in zip(self.columns, values):
+            text = "" if value is None else str(value)
+            width = self.widths[column]
+            if len(text) > width:
+                text = text[:width - 1] + "~"
+            cells.append(text.ljust(width))
+        print("  ".join(cells).rstrip(), file=self.out, flush=True)
@@ -1,15 +1,7 @@
-from docker_controllers.interact import interactwithdocker
-from docker_controllers.orchestrate import orchestratedocker
-from docker_controllers.compose import dockercompose
-
-from k8s_controllers.pod import manage_pods
-from k8s_controllers.deployments import manage_deployments
-from k8s_controllers.services import manage_services
-
-
-
 def main_menu():
     "Main function for running the entire logic"
+    # Each subsystem is imported the first time its menu is chosen, so the
+    # docker and kubernetes SDKs only load for users who need them.
     
     while True:
         print("\nWelcome to Container Management Menu!!!")
@@ -28,11 +20,14 @@ def main_menu():
                 
                 action_choice = input("Enter your choice: ")
                 if action_choice == "1":
-                  interactwithdocker()
+                    from docker_controllers.interact import interactwithdocker
+                    interactwithdocker()
                 elif action_choice == "2":
+                    from docker_controllers.orchestrate import orchestratedocker
                     orchestratedocker()
                 elif action_choice == "3":
-                     dockercompose()
+                    from docker_controllers.compose import dockercompose
+                    dockercompose()
                 elif action_choice == "4":
                     break
                 else:
@@ -49,10 +44,13 @@ def main_menu():
                 
                 action_choice = input("Enter your choice: ")
                 if action_choice == "1":
+                    from k8s_controllers.pods import manage_pods
                     manage_pods()
                 elif action_choice == "2":
+                    from k8s_controllers.deployments import manage_deployments
                     manage_deployments()
                 elif action_choice == "3":
+                    from k8s_controllers.services import manage_services
                     manage_services()
                 elif action_choice == "4":
                     break
@@ -68,4 +66,6 @@ def main_menu():
             print("Invalid choice. Please select a valid option.")
 
 if __name__ == "__main__":
+    import metrics
+    metrics.start()
     main_menu()
\ No newline at end of file
@@ -0,0 +1,316 @@
+"""Latency, error and payload metrics for every Docker and Kubernetes API call.
+
+Metrics are off unless one of these environment variables is set:
+
+    CM_METRICS=1                      collect in memory only
+    CM_METRICS_PORT=9464              also serve them on http://127.0.0.1:9464/metrics
+    CM_METRICS_TEXTFILE=cm.prom       also write them to this file on exit
+
+When they are off the instrument_* functions return the clients untouched,
+so no call pays for a wrapper.
+"""
+import atexit
+import bisect
+import contextvars
+import functools
+import json
+import os
+import sys
+import threading
+import time
+
+ENABLED = any(os.environ.get(name) for name in ("CM_METRICS", "CM_METRICS_PORT", "CM_METRICS_TEXTFILE"))
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+CONTROLLER_PACKAGES = ("docker_controllers.", "k8s_controllers.")
+# Shared plumbing: calls made through these are attributed to their caller.
+PLUMBING_MODULES = {
+    "docker_controllers.aio_engine",
+    "k8s_controllers.apply",
+    "k8s_controllers.clients",
+    "k8s_controllers.pagination",
+}
+
+# Docker paths whose second segment is an action on the collection, not an id.
+DOCKER_COLLECTION_ACTIONS = {"json", "create", "prune", "load", "get", "search", "build"}
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus sense"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Registry:
+    """Holds every series and renders them in the Prometheus text format"""
+
+    def __init__(self):
+        self.latency = {}
+        self.response_size = {}
+        self.request_bytes = {}
+        self.errors = {}
+        self._lock = threading.Lock()
+
+    def record(self, backend, operation, seconds, status=None, request_bytes=0, response_bytes=None,
+               controller=None):
+        """Record one API call"""
+        labels = (backend, controller or caller(), operation)
+        with self._lock:
+            self._histogram(self.latency, labels, LATENCY_BUCKETS).observe(seconds)
+            if response_bytes is not None:
+                self._histogram(self.response_size, labels, SIZE_BUCKETS).observe(response_bytes)
+            self.request_bytes[labels] = self.request_bytes.get(labels, 0) + request_bytes
+            if status is None or status >= 400:
+                key = labels + ("error" if status is None else str(status),)
+                self.errors[key] = self.errors.get(key, 0) + 1
+
+    def render(self):
+        """Return the metrics in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            self._render_histogram(lines, "containermanager_request_duration_seconds",
+                                   "Latency of Docker and Kubernetes API calls", self.latency)
+            self._render_histogram(lines, "containermanager_response_size_bytes",
+                                   "Size of Docker and Kubernetes API responses", self.response_size)
+            lines.append("# HELP containermanager_request_size_bytes_total Bytes sent in API request bodies")
+            lines.append("# TYPE containermanager_request_size_bytes_total counter")
+            for labels, value in sorted(self.request_bytes.items()):
+                lines.append(f"containermanager_request_size_bytes_total{{{_labels(labels)}}} {value}")
+            lines.append("# HELP containermanager_request_errors_total API calls that failed or returned >= 400")
+            lines.append("# TYPE containermanager_request_errors_total counter")
+            for labels, value in sorted(self.errors.items()):
+                lines.append(f"containermanager_request_errors_total{{{_labels(labels[:3])},status=\"{labels[3]}\"}} "
+                             f"{value}")
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _histogram(series, labels, buckets):
+        if labels not in series:
+            series[labels] = Histogram(buckets)
+        return series[labels]
+
+    @staticmethod
+    def _render_histogram(lines, name, help_text, series):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} histogram")
+        for labels, histogram in sorted(series.items()):
+            label_text = _labels(labels)
+            cumulative = 0
+            for bound, count in zip(histogram.buckets + ("+Inf",), histogram.counts):
+                cumulative += count
+                lines.append(f"{name}_bucket{{{label_text},le=\"{bound}\"}} {cumulative}")
+            lines.append(f"{name}_sum{{{label_text}}} {histogram.sum}")
+            lines.append(f"{name}_count{{{label_text}}} {histogram.count}")
+
+
+def _labels(labels):
+    backend, controller, operation = labels
+    operation = operation.replace("\\", "\\\\").replace('"', '\\"')
+    return f'backend="{backend}",controller="{controller}",operation="{operation}"'
+
+
+REGISTRY = Registry()
+CONTROLLER = contextvars.ContextVar("controller", default=None)
+
+
+def caller():
+    """Name the controller module the current API call comes from"""
+    frame = sys._getframe(2)
+    while frame is not None:
+        module = frame.f_globals.get("__name__", "")
+        if module.startswith(CONTROLLER_PACKAGES) and module not in PLUMBING_MODULES:
+            return module.split(".", 1)[1]
+        frame = frame.f_back
+    return "other"
+
+
+def kubernetes_operation(method, path):
+    """Turn a request path into a low-cardinality operation name"""
+    segments = path.split("?", 1)[0].strip("/").split("/")
+    # /api/v1/... or /apis/<group>/<version>/...
+    prefix = 2 if segments[:1] == ["api"] else 3
+    rest = segments[prefix:]
+    for index in range(1, len(rest), 2):
+        rest[index] = "{namespace}" if rest[index - 1] == "namespaces" and index + 1 < len(rest) else "{name}"
+    return f"{method} /" + "/".join(segments[:prefix] + rest)
+
+
+def docker_operation(method, path):
+    """Turn a Docker Engine request path into a low-cardinality operation name"""
+    segments = path.split("?", 1)[0].strip("/").split("/")
+    if segments and segments[0].startswith("v1."):
+        segments = segments[1:]
+    # Image names may contain slashes, so everything between the collection
+    # and the action is the id.
+    if len(segments) >= 3:
+        segments = [segments[0], "{id}", segments[-1]]
+    elif len(segments) == 2 and segments[1] not in DOCKER_COLLECTION_ACTIONS:
+        segments = [segments[0], "{id}"]
+    return f"{method} /" + "/".join(segments)
+
+
+def instrument_kubernetes(api_client):
+    """Time every request a kubernetes ApiClient sends"""
+    if not ENABLED:
+        return api_client
+    rest_client = api_client.rest_client
+    request = rest_client.request
+
+    @functools.wraps(request)
+    def timed_request(method, url, *args, **kwargs):
+        operation = kubernetes_operation(method, url.split("://", 1)[-1].split("/", 1)[-1])
+        request_bytes = _body_size(kwargs.get("body"))
+        started = time.perf_counter()
+        status = None
+        response_bytes = None
+        try:
+            response = request(method, url, *args, **kwargs)
+            status = response.status
+            response_bytes = _response_size(response)
+            return response
+        except Exception as ex:
+            status = getattr(ex, "status", None)
+            raise
+        finally:
+            REGISTRY.record("kubernetes", operation, time.perf_counter() - started, status,
+                            request_bytes, response_bytes)
+
+    rest_client.request = timed_request
+    return api_client
+
+
+def instrument_docker(client):
+    """Time every request a docker SDK client sends"""
+    if not ENABLED:
+        return client
+    session = client.api
+    send = session.send
+
+    @functools.wraps(send)
+    def timed_send(prepared, **kwargs):
+        operation = docker_operation(prepared.method, prepared.path_url)
+        request_bytes = _body_size(prepared.body) if not hasattr(prepared.body, "read") else 0
+        started = time.perf_counter()
+        status = None
+        response_bytes = None
+        try:
+            response = send(prepared, **kwargs)
+            status = response.status_code
+            if "content-length" in response.headers:
+                response_bytes = int(response.headers["content-length"])
+            return response
+        finally:
+            REGISTRY.record("docker", operation, time.perf_counter() - started, status,
+                            request_bytes, response_bytes)
+
+    session.send = timed_send
+    return client
+
+
+def instrument_engine(sync_engine):
+    """Time every request a SyncDockerEngine sends to its AsyncDockerEngine"""
+    if not ENABLED:
+        return sync_engine
+    engine = sync_engine.engine
+    call = sync_engine.call
+    request = engine.request
+
+    @functools.wraps(call)
+    def attributed_call(coroutine):
+        # The request runs on the engine's event loop thread; the context
+        # variable carries the calling controller over to it.
+        token = CONTROLLER.set(caller())
+        try:
+            return call(coroutine)
+        finally:
+            CONTROLLER.reset(token)
+
+    @functools.wraps(request)
+    async def timed_request(method, path, params=None, body=None):
+        started = time.perf_counter()
+        status = None
+        response_bytes = None
+        try:
+            status, headers, data = await request(method, path, params, body)
+            response_bytes = len(data)
+            return status, headers, data
+        except Exception as ex:
+            status = getattr(ex, "status", None)
+            raise
+        finally:
+            REGISTRY.record("docker", docker_operation(method, path), time.perf_counter() - started, status,
+                            _body_size(body), response_bytes, CONTROLLER.get())
+
+    sync_engine.call = attributed_call
+    engine.request = timed_request
+    return sync_engine
+
+
+def _body_size(body):
+    if body is None:
+        return 0
+    if isinstance(body, (str, bytes)):
+        return len(body)
+    return len(json.dumps(body, default=str))
+
+
+def _response_size(response):
+    length = response.getheader("content-length") if hasattr(response, "getheader") else None
+    if length is not None:
+        return int(length)
+    data = getattr(response, "data", None)
+    # Streaming responses (watches, logs) are not read here.
+    return len(data) if isinstance(data, bytes) and getattr(response, "_preload_content", True) else None
+
+
+def write_textfile(path):
+    """Write the metrics to path atomically, for the node_exporter textfile collector"""
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "w") as textfile:
+        textfile.write(REGISTRY.render())
+    os.replace(temporary, path)
+
+
+def serve(port, host="127.0.0.1"):
+    """Serve /metrics on a background thread, returning the server"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?", 1)[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = REGISTRY.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True, name="metrics").start()
+    return server
+
+
+def start():
+    """Start the exporters configured in the environment"""
+    if not ENABLED:
+        return
+    if os.environ.get("CM_METRICS_PORT"):
+        serve(int(os.environ["CM_METRICS_PORT"]))
+    if os.environ.get("CM_METRICS_TEXTFILE"):
+        atexit.register(write_textfile, os.environ["CM_METRICS_TEXTFILE"])
@@ -0,0 +1,64 @@
+"""Dependency graphs of batch steps, compose services and Kubernetes manifests.
+
+A graph maps every node to the nodes it needs. check_graph() rejects unknown
+needs and cycles before anything runs; run_graph() then runs every node as
+soon as everything it needs has finished.
+"""
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+def check_graph(graph, noun="node"):
+    """Reject needs on unknown nodes and dependency cycles, returning the nodes in waves"""
+    for key, needs in graph.items():
+        unknown = sorted(set(needs) - set(graph))
+        if unknown:
+            raise ValueError(f"{noun} '{key}' needs unknown {noun}(s) {', '.join(unknown)}")
+
+    # Kahn's algorithm, a wave at a time; anything left over sits on a cycle.
+    remaining = {key: set(needs) for key, needs in graph.items()}
+    waves = []
+    while remaining:
+        wave = sorted(key for key, needs in remaining.items() if not needs)
+        if not wave:
+            raise ValueError(f"dependency cycle between {noun}s {', '.join(sorted(remaining))}")
+        waves.append(wave)
+        for key in wave:
+            del remaining[key]
+        for needs in remaining.values():
+            needs.difference_update(wave)
+    return waves
+
+
+def run_graph(graph, run, workers=None):
+    """Call run(key, results) for every node once all of its needs have finished, returning the results by key
+
+    results holds the return value of every finished node, so run() can look
+    at those of its needs (a failed need does not stop its dependents from
+    running). At most workers nodes run at once, by default all of them.
+    """
+    dependents = {key: [] for key in graph}
+    waiting = {}
+    for key, needs in graph.items():
+        waiting[key] = set(needs)
+        for need in needs:
+            dependents[need].append(key)
+
+    results = {}
+    with ThreadPoolExecutor(max_workers=workers or max(1, len(graph))) as pool:
+        running = {}
+
+        def submit_ready():
+            for key in [key for key, needs in waiting.items() if not needs]:
+                del waiting[key]
+                running[pool.submit(run, key, results)] = key
+
+        submit_ready()
+        while running:
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                key = running.pop(future)
+                results[key] = future.result()
+                for dependent in dependents[key]:
+                    waiting[dependent].discard(key)
+            submit_ready()
+    return results